@@ -0,0 +1,54 @@
+# Times matching a single frequently traded asset where most disposals are
+# matched to acquisitions within the following 30 days. The time per trading
+# day should stay about the same as the number of days grows.
+
+import datetime, random, time
+from decimal import Decimal
+from pycryptax import datemap, gains
+
+SIZES = (2000, 8000, 32000)
+
+def makeDays(days):
+
+    dayTxs = datemap.DateMap()
+    date = datetime.datetime(1900, 1, 1)
+
+    # Buy on most days and sell slightly more than is bought on others, so
+    # disposals reach forwards into many later acquisitions
+    for i in range(days):
+
+        tx = gains.AggregateDayTxs()
+
+        if i % 3:
+            tx.acquire(Decimal(random.randint(1, 10)), Decimal(random.randint(1, 900)))
+        else:
+            tx.dispose(Decimal(random.randint(5, 40)), Decimal(random.randint(1, 900)))
+
+        dayTxs.insert(date, tx)
+        date += datetime.timedelta(days=1)
+
+    # An opening holding so that no disposal exceeds it
+    dayTxs[0][1].acquire(Decimal(days * 40), Decimal(days))
+
+    return dayTxs
+
+def main():
+
+    random.seed(0)
+
+    print("{:>8} {:>12} {:>16}".format("DAYS", "TIME (s)", "PER DAY (us)"))
+
+    for days in SIZES:
+
+        dayTxs = makeDays(days)
+
+        t = time.perf_counter()
+        gains.matchAsset("foo", dayTxs, (), None, [])
+        elapsed = time.perf_counter() - t
+
+        print("{:>8} {:>12.3f} {:>16.2f}".format(
+            days, elapsed, elapsed / days * 1e6
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Times loading long price histories from CSV files against mapping binary
+# price files converted from them, and looking up prices in each. Both must
+# give the same price for every lookup. Memory allocated by loading is also
+# reported.
+#
+# Exits with an error if the prices differ.
+
+import datetime, os, random, sys, tempfile, time, tracemalloc
+from pycryptax import prices
+from benchmarks import synthetic
+
+DAYS = 20000
+ASSETS = 10
+LOOKUPS = 100000
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+def loadMeasured(path):
+
+    # Returns the prices, the time taken to load them and the bytes allocated.
+    # Memory is measured with a second load as tracing slows loading.
+
+    priceData, seconds = timed(lambda: prices.Prices("gbp", path))
+
+    tracemalloc.start()
+    traced = prices.Prices("gbp", path)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+
+    return priceData, seconds, allocated
+
+def lookup(priceData, pairs):
+    return priceData.priceMany(pairs)
+
+def main():
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else DAYS
+
+    with tempfile.TemporaryDirectory() as path:
+
+        rand = random.Random(0)
+        names = synthetic.assetNames(ASSETS)
+        chain = synthetic.chainNames(2, "gbp")
+        synthetic.writePrices(path, names, chain, days, rand)
+
+        csvPrices, csvTime, csvMemory = loadMeasured(path)
+
+        _, convertTime = timed(lambda: prices.convertToBinary(path))
+
+        for f in os.listdir(path):
+            if f.endswith(".csv"):
+                os.remove(path + "/" + f)
+
+        binPrices, binTime, binMemory = loadMeasured(path)
+
+        start = datetime.datetime.combine(synthetic.START, datetime.time())
+        pairs = sorted(
+            (
+                rand.choice(names),
+                start + datetime.timedelta(days=rand.randrange(days))
+            )
+            for i in range(LOOKUPS)
+        )
+
+        expected, csvLookup = timed(lambda: lookup(csvPrices, pairs))
+        actual, binLookup = timed(lambda: lookup(binPrices, pairs))
+
+    print("converted in {:.3f}s\n".format(convertTime))
+    print("{:<24} {:>12} {:>12}".format("", "CSV", "BINARY"))
+    print("{:<24} {:>12.3f} {:>12.3f}".format("load (s)", csvTime, binTime))
+    print("{:<24} {:>12.1f} {:>12.1f}".format(
+        "load memory (MiB)", csvMemory / (1 << 20), binMemory / (1 << 20)
+    ))
+    print("{:<24} {:>12.3f} {:>12.3f}".format(
+        "{} lookups (s)".format(LOOKUPS), csvLookup, binLookup
+    ))
+
+    if expected != actual:
+        sys.exit("Binary prices differ from CSV prices")
+
+if __name__ == '__main__':
+    main()
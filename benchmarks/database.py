@@ -0,0 +1,116 @@
+# Times calculations that read a SQLite database made by the 'import' command
+# against those that parse the CSV files, and checks that both give the same
+# figures. Short queries over a single year are timed as well as the whole
+# history, as the database reads only the income of the period.
+#
+# Exits with an error if the results differ.
+
+import datetime, sys, tempfile, time
+from pycryptax import csvdata, database, gains, income, prices
+from benchmarks import synthetic
+
+TRADES = 100000
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+def figuresOf(calc):
+
+    # Every figure of the calculation as (description, Decimal)
+
+    period = calc._periods[0]
+
+    yield "total cost", period.totalGain.cost()
+    yield "total value", period.totalGain.value()
+
+    for asset, gain in period.assetGain.items():
+        yield asset + " cost", gain.cost()
+        yield asset + " value", gain.value()
+
+    for i, (date, (asset, gain)) in enumerate(period.disposals):
+        yield "disposal {} {} cost".format(i, asset), gain.cost()
+        yield "disposal {} {} value".format(i, asset), gain.value()
+
+    for asset, pool in period.assetPoolsAtEnd.items():
+        yield asset + " quantity", pool.totalQuantity
+        yield asset + " pool cost", pool.totalCost
+
+def report(name, csvTime, dbTime):
+    print("{:<28} {:>12.3f} {:>12.3f}".format(name, csvTime, dbTime))
+
+def incomeFigures(calc):
+    return [
+        (tx.asset, tx.date, tx.amount, tx.price, tx.note) for tx in calc._txs
+    ]
+
+def main():
+
+    trades = int(sys.argv[1]) if len(sys.argv) > 1 else TRADES
+    failed = False
+
+    with tempfile.TemporaryDirectory() as path:
+
+        first, last = synthetic.writeWorkingDir(
+            path, trades, assets=20, chainDepth=2, years=4, files=4
+        )
+
+        start = datetime.datetime.combine(first, datetime.time())
+        end = datetime.datetime.combine(last, datetime.time())
+        yearStart = end - datetime.timedelta(days=364)
+
+        db = database.Database(path + "/data.db")
+        counts, importTime = timed(lambda: db.importDir(path))
+
+        print("imported {} in {:.3f}s\n".format(counts, importTime))
+        print("{:<28} {:>12} {:>12}".format("", "CSV (s)", "DATABASE (s)"))
+
+        def csvGain():
+            return gains.CapitalGainCalculator(
+                csvdata.CSVGains.stream(path + "/gains"),
+                prices.Prices("gbp", path + "/prices"), start, end,
+                disposals=True
+            )
+
+        def dbGain():
+            return gains.CapitalGainCalculator(
+                db.gainData(), db.priceData("gbp"), start, end, disposals=True
+            )
+
+        expected, csvTime = timed(csvGain)
+        actual, dbTime = timed(dbGain)
+        report("gain", csvTime, dbTime)
+
+        if list(figuresOf(expected)) != list(figuresOf(actual)):
+            print("Gains differ")
+            failed = True
+
+        for name, periodStart in (("income", start), ("income, last year", yearStart)):
+
+            def csvIncome():
+                return income.IncomeCalculator(
+                    csvdata.CSVIncome(path + "/income"),
+                    prices.Prices("gbp", path + "/prices"), periodStart, end
+                )
+
+            def dbIncome():
+                return income.IncomeCalculator(
+                    db.incomeData(), db.priceData("gbp"), periodStart, end
+                )
+
+            expected, csvTime = timed(csvIncome)
+            actual, dbTime = timed(dbIncome)
+            report(name, csvTime, dbTime)
+
+            if incomeFigures(expected) != incomeFigures(actual):
+                print("Income differs for " + name)
+                failed = True
+
+        db.close()
+
+    if failed:
+        sys.exit("The database does not agree with the CSV files")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Compares util.dateFromString with the previous strptime based parser on
+# daily price dates, where each date string appears in several files.
+
+import datetime, timeit
+from pycryptax import util
+
+def previousDateFromString(s):
+    try:
+        return datetime.datetime.strptime(s, "%Y-%m-%d")
+    except ValueError:
+        return datetime.datetime.strptime(s, "%d %b %Y")
+
+def main():
+
+    start = datetime.date(2010, 1, 1)
+    days = [
+        (start + datetime.timedelta(days=i)).isoformat() for i in range(3650)
+    ]
+    textDays = [
+        (start + datetime.timedelta(days=i)).strftime("%d %b %Y")
+        for i in range(3650)
+    ]
+
+    # Several price files covering the same dates
+    dates = days * 10
+    textDates = textDays * 10
+
+    isoParse = util.dateParserFor(dates[0])
+
+    cases = (
+        ("previous (ISO)", previousDateFromString, dates),
+        ("dateFromString (ISO)", util.dateFromString, dates),
+        ("per file parser (ISO)", isoParse, dates),
+        ("previous (text)", previousDateFromString, textDates),
+        ("dateFromString (text)", util.dateFromString, textDates),
+    )
+
+    print("{:<24} {:>14} {:>14}".format("", "COLD (ns)", "WARM (ns)"))
+
+    for name, parse, data in cases:
+
+        def run():
+            for s in data:
+                parse(s)
+
+        # Cold runs start with an empty date cache, warm runs reuse it
+
+        def cold():
+            util.isoDateFromString.cache_clear()
+            run()
+
+        coldTime = min(timeit.repeat(cold, number=1, repeat=5))
+        warmTime = min(timeit.repeat(run, number=1, repeat=5))
+
+        print("{:<24} {:>14.1f} {:>14.1f}".format(
+            name, coldTime * 1e9 / len(data), warmTime * 1e9 / len(data)
+        ))
+
+if __name__ == '__main__':
+    main()
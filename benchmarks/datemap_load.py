@@ -0,0 +1,75 @@
+# Measures how CSVDateMap load time scales with the number of rows. The time
+# divided by n log n should stay roughly flat as n grows.
+
+import datetime, math, random, tempfile, time
+from pycryptax import csvdata, datemap
+
+SIZES = (10000, 20000, 40000, 80000, 160000)
+FILES = 4
+
+def writeGains(path, rows):
+
+    start = datetime.date(2010, 1, 1)
+    perFile = rows // FILES
+
+    for i in range(FILES):
+        with open("{}/trades{}.csv".format(path, i), "w") as f:
+            f.write("DATE,SELL ASSET,SELL AMOUNT,BUY ASSET,BUY AMOUNT\n")
+            for j in range(perFile):
+                date = start + datetime.timedelta(days=j * 3650 // perFile)
+                f.write("{},gbp,{},foo,{}\n".format(
+                    date.isoformat(), random.randint(1, 1000),
+                    random.randint(1, 1000)
+                ))
+
+def timeLoad(path):
+    t = time.perf_counter()
+    csvdata.CSVGains(path)
+    return time.perf_counter() - t
+
+def timeInsert(rows):
+
+    # The previous approach: one sorted insertion per row
+
+    dm = datemap.DateMap()
+    t = time.perf_counter()
+
+    for date, value in rows:
+        dm.insert(date, value)
+
+    return time.perf_counter() - t
+
+def timeExtend(rows):
+    dm = datemap.DateMap()
+    t = time.perf_counter()
+    dm.extend(rows)
+    return time.perf_counter() - t
+
+def main():
+
+    random.seed(0)
+
+    print("{:>8} {:>10} {:>14} {:>12} {:>12}".format(
+        "ROWS", "LOAD (s)", "us / n log n", "INSERT (s)", "EXTEND (s)"
+    ))
+
+    for n in SIZES:
+
+        with tempfile.TemporaryDirectory() as path:
+            writeGains(path, n)
+            load = timeLoad(path)
+
+        # Rows from several sorted files, in file order
+        base = datetime.datetime(2010, 1, 1)
+        rows = [
+            (base + datetime.timedelta(days=j * 3650 // (n // FILES)), j)
+            for i in range(FILES) for j in range(n // FILES)
+        ]
+
+        print("{:>8} {:>10.3f} {:>14.4f} {:>12.3f} {:>12.3f}".format(
+            n, load, load * 1e6 / (n * math.log2(n)), timeInsert(rows),
+            timeExtend(rows)
+        ))
+
+if __name__ == '__main__':
+    main()
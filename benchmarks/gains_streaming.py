@@ -0,0 +1,85 @@
+# Compares the peak memory of capital gain calculations when the gains CSV files
+# are loaded into a CSVGains map first and when they are streamed into the
+# calculator. With streaming the peak depends on the number of trading days
+# rather than the number of trades.
+
+import datetime, os, random, tempfile, time, tracemalloc
+from pycryptax import csvdata, gains, prices
+
+TRADES = (20000, 80000, 320000)
+DAYS = 500
+ASSETS = ("foo", "bar", "baz")
+
+def writeData(path, trades):
+
+    start = datetime.date(2000, 1, 1)
+
+    os.mkdir(path + "/prices")
+    os.mkdir(path + "/gains")
+
+    for asset in ASSETS:
+        with open("{}/prices/{}_gbp.csv".format(path, asset), "w") as f:
+            f.write("DATE,PRICE\n")
+            for i in range(DAYS):
+                f.write("{},{}\n".format(
+                    (start + datetime.timedelta(days=i)).isoformat(),
+                    random.randint(100, 200)
+                ))
+
+    with open(path + "/gains/trades.csv", "w") as f:
+
+        f.write("DATE,SELL ASSET,SELL AMOUNT,BUY ASSET,BUY AMOUNT\n")
+
+        # Many small fills each day. Each asset is bought twice then sold.
+        for i in range(trades):
+            date = (start + datetime.timedelta(days=i * DAYS // trades)).isoformat()
+            asset = ASSETS[i // 3 % len(ASSETS)]
+            if i % 3 < 2:
+                f.write("{},gbp,{},{},1\n".format(date, random.randint(1, 500), asset))
+            else:
+                f.write("{},{},1,gbp,{}\n".format(date, asset, random.randint(1, 500)))
+
+    return datetime.datetime(2000, 1, 1), datetime.datetime(2002, 1, 1)
+
+def measure(getGainData, priceData, start, end):
+
+    tracemalloc.start()
+    t = time.perf_counter()
+
+    gains.CapitalGainCalculator(getGainData(), priceData, start, end)
+
+    elapsed = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak / 1e6
+
+def main():
+
+    random.seed(0)
+
+    print("{:>8} {:>14} {:>14} {:>14} {:>14}".format(
+        "TRADES", "LOADED (s)", "LOADED (MB)", "STREAMED (s)", "STREAMED (MB)"
+    ))
+
+    for trades in TRADES:
+
+        with tempfile.TemporaryDirectory() as path:
+
+            start, end = writeData(path, trades)
+            priceData = prices.Prices("gbp", path + "/prices")
+
+            loaded = measure(
+                lambda: csvdata.CSVGains(path + "/gains"), priceData, start, end
+            )
+            streamed = measure(
+                lambda: csvdata.CSVGains.stream(path + "/gains"), priceData,
+                start, end
+            )
+
+        print("{:>8} {:>14.3f} {:>14.1f} {:>14.3f} {:>14.1f}".format(
+            trades, loaded[0], loaded[1], streamed[0], streamed[1]
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# Times reloading a working directory after rows are appended to its files and
+# after files change, against loading it again, with and without the parse
+# cache. Each reload must give the same rows in the same order as a new load,
+# and prices for every asset must match those of a new Prices.
+#
+# Exits with an error if a reload differs from a new load.
+
+import datetime, os, sys, tempfile, time
+from pycryptax import cache, csvdata, prices
+from benchmarks import synthetic
+
+TRADES = 200000
+FILES = 20
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+def appendRows(filename, rows):
+    # Adds rows at the end of a CSV file
+    with open(filename, "a") as f:
+        f.write(rows)
+
+def rowsOf(dateMap):
+    return [
+        (date, tuple(getattr(tx, slot) for slot in type(tx).__slots__))
+        for date, tx in zip(dateMap.dates(), dateMap.values())
+    ]
+
+def sameMap(a, b):
+    return rowsOf(a) == rowsOf(b)
+
+def samePrices(a, b, assets, dates):
+    for asset in assets:
+        for date in dates:
+            try:
+                x = a.get(asset, date)
+            except (prices.AssetPricesNotFound, prices.PriceNotFoundForDate) as e:
+                x = type(e)
+            try:
+                y = b.get(asset, date)
+            except (prices.AssetPricesNotFound, prices.PriceNotFoundForDate) as e:
+                y = type(e)
+            if x != y:
+                return False
+    return True
+
+def rewriteRow(filename, n, row):
+    # Replaces row n of a CSV file, which changes it other than at the end
+    with open(filename) as f:
+        lines = f.readlines()
+    lines[n] = row
+    with open(filename, "w") as f:
+        f.writelines(lines)
+
+def report(name, seconds):
+    print("{:<30} {:>12.3f}".format(name + " (s)", seconds))
+
+def main():
+
+    trades = int(sys.argv[1]) if len(sys.argv) > 1 else TRADES
+    failed = False
+
+    def check(ok, message):
+        nonlocal failed
+        if not ok:
+            print(message)
+            failed = True
+
+    with tempfile.TemporaryDirectory() as path:
+
+        first, last = synthetic.writeWorkingDir(
+            path, trades, assets=20, chainDepth=2, years=4, files=FILES
+        )
+
+        gainsDir = path + "/gains"
+        pricesDir = path + "/prices"
+        parseCache = cache.ParseCache(path + "/cache")
+
+        gainData, seconds = timed(lambda: csvdata.CSVGains(gainsDir))
+        report("load gains", seconds)
+        csvdata.CSVGains(gainsDir, parseCache)
+        priceData = prices.Prices("gbp", pricesDir)
+
+        dates = [
+            datetime.datetime.combine(first, datetime.time())
+            + datetime.timedelta(days=d)
+            for d in range(0, (last - first).days + 2, 7)
+        ]
+        assets = synthetic.assetNames(20) + ["link1"]
+
+        # Build every composite series so that unaffected ones can be kept
+        samePrices(priceData, priceData, assets, dates[:1])
+
+        # Rows appended to a file, some on dates already in the map
+        appendRows(gainsDir + "/exchange3.csv", "".join(
+            "{},gbp,10,tok{},1\n".format(
+                (first + datetime.timedelta(days=d * 50)).isoformat(), d
+            ) for d in range(10)
+        ))
+
+        changed, seconds = timed(gainData.reload)
+        report("reload appended rows", seconds)
+        check(
+            sameMap(gainData, csvdata.CSVGains(gainsDir)),
+            "Gains differ from a new load after appending rows"
+        )
+
+        cached, seconds = timed(lambda: csvdata.CSVGains(gainsDir, parseCache))
+        report("load appended with cache", seconds)
+        check(
+            sameMap(cached, gainData),
+            "Gains differ when appended rows are read with the cache"
+        )
+
+        # A row changed in one file and another file added
+        rewriteRow(gainsDir + "/exchange5.csv", 1, "{},gbp,7,tok3,2\n".format(
+            first.isoformat()
+        ))
+
+        with open(gainsDir + "/exchange99.csv", "w") as f:
+            f.write("DATE,SELL ASSET,SELL AMOUNT,BUY ASSET,BUY AMOUNT\n")
+            f.write("{},gbp,5,tok2,1\n".format(first.isoformat()))
+
+        changed, seconds = timed(gainData.reload)
+        report("reload changed files", seconds)
+        print("changed files: " + ", ".join(
+            os.path.basename(f) for f in changed
+        ))
+        check(
+            sameMap(gainData, csvdata.CSVGains(gainsDir)),
+            "Gains differ from a new load after changing files"
+        )
+        check(
+            sameMap(csvdata.CSVGains(gainsDir, parseCache), gainData),
+            "Gains differ when changed files are read with the cache"
+        )
+
+        # Removing a file drops its rows
+        os.remove(gainsDir + "/exchange99.csv")
+        gainData.reload()
+
+        check(
+            sameMap(gainData, csvdata.CSVGains(gainsDir)),
+            "Gains differ from a new load after removing a file"
+        )
+
+        # A row changed in the middle of a file without changing its size
+        filename = gainsDir + "/exchange7.csv"
+
+        with open(filename) as f:
+            lines = f.readlines()
+
+        n = len(lines) // 2
+        row = lines[n].rstrip("\n")
+        rewriteRow(filename, n, row[:-1] + ("3" if row[-1] == "2" else "2") + "\n")
+
+        gainData.reload()
+
+        check(
+            sameMap(gainData, csvdata.CSVGains(gainsDir)),
+            "Gains differ from a new load after changing a row in place"
+        )
+        check(
+            sameMap(csvdata.CSVGains(gainsDir, parseCache), gainData),
+            "Gains differ when a row changed in place is read with the cache"
+        )
+
+        # A price appended to one price file and changed in another
+        appendRows(pricesDir + "/tok5_link1.csv", "{},1.5\n".format(
+            (last + datetime.timedelta(days=1)).isoformat()
+        ))
+        rewriteRow(pricesDir + "/link1_gbp.csv", 5, "{},2.5\n".format(
+            (first + datetime.timedelta(days=4)).isoformat()
+        ))
+
+        affected = priceData.reload()
+        print("affected assets: " + ", ".join(sorted(affected)))
+
+        check(
+            samePrices(
+                priceData, prices.Prices("gbp", pricesDir), assets, dates
+            ),
+            "Reloaded prices differ from new prices"
+        )
+
+    if failed:
+        sys.exit("Reloading does not agree with loading")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# Times building and looking up a composite series from minute prices chained
+# through hourly prices, and reports the memory held by the whole Prices
+# object, with its price files and the composite series, per price. Every
+# lookup is checked against looking up each price file in turn.
+#
+# Exits with an error if any price differs.
+
+import datetime, random, sys, tempfile, time, tracemalloc
+from decimal import Decimal
+from pycryptax import prices, util
+from benchmarks import synthetic
+
+DAYS = 30
+LOOKUPS = 100000
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+def writeIntraday(path, asset, quoted, days, step, rand):
+
+    # Writes a price every step minutes
+
+    start = datetime.datetime.combine(synthetic.START, datetime.time())
+    price = rand.uniform(1, 1000)
+
+    with open("{}/{}_{}.csv".format(path, asset, quoted), "w") as f:
+        f.write("DATE,PRICE\n")
+        for minute in range(0, days * 1440, step):
+            price *= rand.uniform(0.999, 1.001)
+            f.write("{},{:.6f}\n".format(
+                (start + datetime.timedelta(minutes=minute)).isoformat(" "),
+                price
+            ))
+
+def clearDateCaches():
+    # The bounded caches of parsed and converted dates are not part of Prices
+    for f in (
+        util.isoDateFromString, util.dayOf, util.timeKey, util.getPrettyDate
+    ):
+        f.cache_clear()
+
+def measured(f):
+
+    # Returns the result of f and the bytes it allocated that are still held,
+    # other than by the date caches. Tracing slows f, so it is not timed.
+
+    clearDateCaches()
+    tracemalloc.start()
+    result = f()
+    clearDateCaches()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, held
+
+def chainPrice(priceData, asset, date):
+
+    # The price found by looking up each price file of the chain
+
+    links = []
+
+    while asset != priceData.reportAsset():
+        assetPrices = priceData._d[asset]
+        links.append(assetPrices)
+        asset = assetPrices.quotedAsset()
+
+    value = Decimal(1)
+
+    for assetPrices in reversed(links):
+        value = assetPrices[date] * value
+
+    return value
+
+def main():
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else DAYS
+    rand = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as path:
+        writeIntraday(path, "tok", "usd", days, 1, rand)
+        writeIntraday(path, "usd", "gbp", days, 60, rand)
+        priceData, loadTime = timed(lambda: prices.Prices("gbp", path))
+        measuredData, loadBytes = measured(lambda: prices.Prices("gbp", path))
+
+    composite, buildTime = timed(lambda: priceData._getComposite("tok"))
+    buildBytes = measured(lambda: measuredData._getComposite("tok"))[1]
+
+    start = datetime.datetime.combine(synthetic.START, datetime.time())
+    dates = sorted(
+        start + datetime.timedelta(seconds=rand.randrange(days * 86400))
+        for i in range(LOOKUPS)
+    )
+
+    expected = [chainPrice(priceData, "tok", date) for date in dates]
+    batch, batchTime = timed(
+        lambda: priceData.priceMany(("tok", date) for date in dates)
+    )
+    single, singleTime = timed(
+        lambda: [composite.get(date) for date in dates]
+    )
+
+    entries = len(composite._keys)
+    rows = sum(
+        len(assetPrices) for asset, assetPrices in priceData.priceSeries()
+    )
+
+    print("{:<28} {:>12}".format("file prices", rows))
+    print("{:<28} {:>12}".format("composite entries", entries))
+    print("{:<28} {:>12.3f}".format("load (s)", loadTime))
+    print("{:<28} {:>12.3f}".format("build composite (s)", buildTime))
+    print("{:<28} {:>12.1f}".format(
+        "loaded bytes per file price", loadBytes / max(rows, 1)
+    ))
+    print("{:<28} {:>12.1f}".format(
+        "composite bytes per entry", buildBytes / max(entries, 1)
+    ))
+    print("{:<28} {:>12.1f}".format(
+        "Prices bytes (MB)", (loadBytes + buildBytes) / 1e6
+    ))
+    print("{:<28} {:>12.3f}".format(
+        "{} batch lookups (s)".format(LOOKUPS), batchTime
+    ))
+    print("{:<28} {:>12.3f}".format(
+        "{} single lookups (s)".format(LOOKUPS), singleTime
+    ))
+
+    if batch != expected or single != expected:
+        sys.exit("Composite prices differ from the price files")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# Times writing disposals as CSV to a file, to a gzip compressed file, and
+# the gain summary tables, for a calculation with many disposals.
+
+import datetime, os, tempfile, time
+from pycryptax import csvdata, gains, output, prices
+from benchmarks import synthetic
+
+TRADES = 200000
+
+def timeWrite(path, write):
+    t = time.perf_counter()
+    with output.openOutput(path) as f:
+        write(f)
+    return time.perf_counter() - t, os.path.getsize(path)
+
+def main():
+
+    with tempfile.TemporaryDirectory() as path:
+
+        first, last = synthetic.writeWorkingDir(
+            path, TRADES, assets=50, years=4, files=2
+        )
+
+        start = datetime.datetime.combine(first, datetime.time())
+        end = datetime.datetime.combine(last, datetime.time())
+
+        calc = gains.CapitalGainCalculator(
+            csvdata.CSVGains.stream(path + "/gains"),
+            prices.Prices("gbp", path + "/prices"), start, end, disposals=True
+        )
+
+        print("{:>20} {:>10} {:>12}".format("OUTPUT", "TIME (s)", "SIZE (MB)"))
+
+        for name, filename, write in (
+            ("disposals csv", "/disposals.csv", calc.printDisposals),
+            ("disposals csv.gz", "/disposals.csv.gz", calc.printDisposals),
+        ):
+            elapsed, size = timeWrite(path + filename, write)
+            print("{:>20} {:>10.3f} {:>12.1f}".format(name, elapsed, size / 1e6))
+
+if __name__ == '__main__':
+    main()
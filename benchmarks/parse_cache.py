@@ -0,0 +1,103 @@
+# Times loading the gains, income and prices of a working directory from the
+# parse cache against parsing the CSV files, and compares the size of the cache
+# with that of the files. Loads from the cache must give the same rows as
+# parsing.
+#
+# Exits with an error if rows loaded from the cache differ.
+
+import os, sys, tempfile, time
+from pycryptax import cache, csvdata, prices
+from benchmarks import synthetic
+
+TRADES = 200000
+FILES = 20
+REPEAT = 3
+
+def bestOf(f):
+
+    best = None
+
+    for i in range(REPEAT):
+        # The rows of the previous load are freed outside of the timing
+        result = None
+        start = time.perf_counter()
+        result = f()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return result, best
+
+def rowsOf(dateMap):
+    return [
+        (date, tuple(getattr(value, slot) for slot in type(value).__slots__))
+        for date, value in zip(dateMap.dates(), dateMap.values())
+    ]
+
+def priceRows(priceData):
+    return [
+        (asset, assetPrices.quotedAsset(), assetPrices.dates(),
+            list(assetPrices.values()))
+        for asset, assetPrices in sorted(priceData.priceSeries())
+    ]
+
+def dirBytes(path):
+    return sum(
+        os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+    )
+
+def main():
+
+    trades = int(sys.argv[1]) if len(sys.argv) > 1 else TRADES
+    failed = False
+
+    with tempfile.TemporaryDirectory() as path:
+
+        synthetic.writeWorkingDir(
+            path, trades, assets=20, chainDepth=2, years=4, files=FILES
+        )
+
+        parseCache = cache.ParseCache(path + "/cache")
+
+        # (name, load, rows of what was loaded)
+        loaders = [
+            ("gains", lambda c: csvdata.CSVGains(path + "/gains", c), rowsOf),
+            ("income", lambda c: csvdata.CSVIncome(path + "/income", c), rowsOf),
+            ("prices", lambda c: prices.Prices("gbp", path + "/prices", c),
+                priceRows),
+        ]
+
+        print("{:<8} {:>10} {:>10} {:>10} {:>8} {:>10} {:>10}".format(
+            "DATA", "PARSE (s)", "STORE (s)", "CACHE (s)", "SPEEDUP",
+            "CSV (MB)", "CACHE (MB)"
+        ))
+
+        for name, load, rows in loaders:
+
+            before = dirBytes(path + "/cache")
+
+            parsed, parseTime = bestOf(lambda: load(None))
+
+            start = time.perf_counter()
+            load(parseCache)
+            storeTime = time.perf_counter() - start
+
+            cached, cacheTime = bestOf(lambda: load(parseCache))
+
+            print(
+                "{:<8} {:>10.3f} {:>10.3f} {:>10.3f} {:>8.1f} {:>10.1f} "
+                "{:>10.1f}".format(
+                    name, parseTime, storeTime, cacheTime, parseTime / cacheTime,
+                    dirBytes(path + "/" + name) / 1e6,
+                    (dirBytes(path + "/cache") - before) / 1e6
+                )
+            )
+
+            if rows(cached) != rows(parsed):
+                print("Rows loaded from the cache differ for " + name)
+                failed = True
+
+    if failed:
+        sys.exit("The parse cache does not agree with parsing")
+
+if __name__ == '__main__':
+    main()
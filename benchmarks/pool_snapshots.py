@@ -0,0 +1,76 @@
+# Shows that the cost of recording section 104 holdings does not grow with the
+# number of trading days before the end of the calculation period. Each size is
+# timed with the period ending on the first day and on the last day. Before
+# holdings were only recorded at period boundaries, the difference grew with
+# the number of days as every day before the end made a deep copy.
+
+import datetime, os, random, tempfile, time
+from pycryptax import csvdata, gains, prices
+
+SIZES = (2000, 4000, 8000, 16000)
+ASSETS = ("foo", "bar", "baz")
+
+def writeData(path, days):
+
+    start = datetime.date(1990, 1, 1)
+
+    os.mkdir(path + "/prices")
+    os.mkdir(path + "/gains")
+
+    for asset in ASSETS:
+        with open("{}/prices/{}_gbp.csv".format(path, asset), "w") as f:
+            f.write("DATE,PRICE\n")
+            for i in range(days):
+                f.write("{},{}\n".format(
+                    (start + datetime.timedelta(days=i)).isoformat(),
+                    random.randint(100, 200)
+                ))
+
+    with open(path + "/gains/trades.csv", "w") as f:
+
+        f.write("DATE,SELL ASSET,SELL AMOUNT,BUY ASSET,BUY AMOUNT\n")
+
+        # Buy every day and sell every other day so the holding keeps growing
+        for i in range(days):
+            date = (start + datetime.timedelta(days=i)).isoformat()
+            for asset in ASSETS:
+                f.write("{},gbp,{},{},2\n".format(date, random.randint(1, 500), asset))
+                if i % 2:
+                    f.write("{},{},1,gbp,{}\n".format(date, asset, random.randint(1, 500)))
+
+    return start, start + datetime.timedelta(days=days - 1)
+
+def timeCalc(gainData, priceData, start, end):
+    t = time.perf_counter()
+    gains.CapitalGainCalculator(gainData, priceData, start, end)
+    return time.perf_counter() - t
+
+def main():
+
+    random.seed(0)
+
+    print("{:>8} {:>16} {:>16} {:>12}".format(
+        "DAYS", "END FIRST (s)", "END LAST (s)", "DIFF (s)"
+    ))
+
+    for days in SIZES:
+
+        with tempfile.TemporaryDirectory() as path:
+
+            first, last = writeData(path, days)
+            priceData = prices.Prices("gbp", path + "/prices")
+            gainData = csvdata.CSVGains(path + "/gains")
+
+            start = datetime.datetime(1980, 1, 1)
+            endFirst = datetime.datetime.combine(first, datetime.time())
+            endLast = datetime.datetime.combine(last, datetime.time())
+
+            early = min(timeCalc(gainData, priceData, start, endFirst) for i in range(3))
+            late = min(timeCalc(gainData, priceData, start, endLast) for i in range(3))
+
+        print("{:>8} {:>16.3f} {:>16.3f} {:>12.3f}".format(
+            days, early, late, late - early
+        ))
+
+if __name__ == '__main__':
+    main()
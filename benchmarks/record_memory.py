@@ -0,0 +1,72 @@
+# Measures the memory held by loaded gains and income rows with tracemalloc, for
+# a synthetic data set of a million trades by default. The number of trades can
+# be given as an argument.
+
+import datetime, os, random, sys, tempfile, time, tracemalloc
+from pycryptax import csvdata
+
+TRADES = 1000000
+ASSETS = ["tok{}".format(i) for i in range(50)]
+
+def writeData(path, trades):
+
+    start = datetime.date(2010, 1, 1)
+
+    os.mkdir(path + "/gains")
+    os.mkdir(path + "/income")
+
+    with open(path + "/gains/trades.csv", "w") as g, \
+            open(path + "/income/income.csv", "w") as i:
+
+        g.write("DATE,SELL ASSET,SELL AMOUNT,BUY ASSET,BUY AMOUNT\n")
+        i.write("DATE,ASSET,AMOUNT,NOTE\n")
+
+        for n in range(trades):
+
+            date = (start + datetime.timedelta(days=n * 3650 // trades)).isoformat()
+            asset = random.choice(ASSETS)
+            amount = random.randint(1, 100000) / 1000
+
+            g.write("{},gbp,{},{},{}\n".format(
+                date, random.randint(1, 500), asset, amount
+            ))
+            i.write("{},{},{},\n".format(date, asset, amount))
+
+def measure(load):
+
+    tracemalloc.start()
+    t = time.perf_counter()
+
+    data = load()
+
+    elapsed = time.perf_counter() - t
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del data
+    return elapsed, current
+
+def main():
+
+    trades = int(sys.argv[1]) if len(sys.argv) > 1 else TRADES
+    random.seed(0)
+
+    print("{:>8} {:>10} {:>12} {:>14}".format(
+        "DATA", "TIME (s)", "HELD (MB)", "PER ROW (B)"
+    ))
+
+    with tempfile.TemporaryDirectory() as path:
+
+        writeData(path, trades)
+
+        for name, load in (
+            ("gains", lambda: csvdata.CSVGains(path + "/gains")),
+            ("income", lambda: csvdata.CSVIncome(path + "/income"))
+        ):
+            elapsed, held = measure(load)
+            print("{:>8} {:>10.2f} {:>12.1f} {:>14.0f}".format(
+                name, elapsed, held / 1e6, held / trades
+            ))
+
+if __name__ == '__main__':
+    main()
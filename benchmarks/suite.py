@@ -0,0 +1,194 @@
+# Times the loaders and every command line action on synthetic working
+# directories of increasing size, and records the results as JSON so they can
+# be compared between commits. For example:
+#
+#   python -m benchmarks.suite --output before.json
+#   python -m benchmarks.suite --output after.json --compare before.json
+#
+# For each benchmark the growth exponent between consecutive sizes is shown. A
+# value near 1 is linear, while values well above 1 show super-linear
+# behaviour.
+
+import argparse, contextlib, datetime, io, json, math, os, platform, \
+    subprocess, sys, tempfile, time
+from pycryptax import __main__ as cli, csvdata, prices
+from benchmarks import synthetic
+
+ACTIONS = ("income", "txs", "gain", "disposals")
+
+def gitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def bestOf(repeat, run):
+
+    times = []
+
+    for i in range(repeat):
+        t = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t)
+
+    return times
+
+def runAction(path, action, start, end):
+
+    argv = sys.argv
+    sys.argv = [
+        "pycryptax", action, start.isoformat(), end.isoformat(), "-d", path
+    ]
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli.main()
+    finally:
+        sys.argv = argv
+
+def benchmarksFor(path, start, end):
+
+    # (name, function) for everything timed on one working directory
+
+    loaders = [
+        ("Prices", lambda: prices.Prices("gbp", path + "/prices")),
+        ("CSVGains", lambda: csvdata.CSVGains(path + "/gains")),
+        ("CSVIncome", lambda: csvdata.CSVIncome(path + "/income")),
+    ]
+
+    actions = [
+        (action, lambda action=action: runAction(path, action, start, end))
+        for action in ACTIONS
+    ]
+
+    return loaders + actions
+
+def printScaling(results):
+
+    names = []
+
+    for r in results:
+        if r["name"] not in names:
+            names.append(r["name"])
+
+    sizes = sorted({r["trades"] for r in results})
+    best = {(r["name"], r["trades"]): r["best"] for r in results}
+
+    print("\n{:>10}".format("") + "".join("{:>12}".format(s) for s in sizes)
+        + "{:>12}".format("GROWTH"))
+
+    for name in names:
+
+        times = [best[name, s] for s in sizes]
+
+        # The exponent k in time ~ size^k between the smallest and largest
+        growth = ""
+        if len(sizes) > 1 and times[0] > 0:
+            growth = "{:.2f}".format(
+                math.log(times[-1] / times[0]) / math.log(sizes[-1] / sizes[0])
+            )
+
+        print("{:>10}".format(name)
+            + "".join("{:>12.4f}".format(t) for t in times)
+            + "{:>12}".format(growth))
+
+def printComparison(results, baseline):
+
+    before = {(r["name"], r["trades"]): r["best"] for r in baseline["results"]}
+
+    print("\nCompared with {}:\n".format(baseline.get("commit")))
+    print("{:>10} {:>10} {:>12} {:>12} {:>8}".format(
+        "", "TRADES", "BEFORE (s)", "AFTER (s)", "RATIO"
+    ))
+
+    for r in results:
+
+        old = before.get((r["name"], r["trades"]))
+
+        if old is None:
+            continue
+
+        print("{:>10} {:>10} {:>12.4f} {:>12.4f} {:>8.2f}".format(
+            r["name"], r["trades"], old, r["best"],
+            r["best"] / old if old > 0 else float("inf")
+        ))
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark pycryptax on synthetic data"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[2000, 8000, 32000],
+        help="The numbers of trades to sweep over"
+    )
+    parser.add_argument("--assets", type=int, default=20)
+    parser.add_argument(
+        "--depth", type=int, default=2,
+        help="The number of price files linking a token to the reporting asset"
+    )
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--only", type=str, nargs="+", default=None,
+        help="Only run the named benchmarks"
+    )
+    parser.add_argument("--output", type=str, default=None, metavar="PATH")
+    parser.add_argument("--compare", type=str, default=None, metavar="PATH")
+
+    args = parser.parse_args()
+
+    config = {
+        "assets": args.assets, "depth": args.depth, "years": args.years,
+        "files": args.files, "repeat": args.repeat, "seed": args.seed
+    }
+
+    results = []
+
+    for trades in args.sizes:
+
+        with tempfile.TemporaryDirectory() as path:
+
+            start, end = synthetic.writeWorkingDir(
+                path, trades, args.assets, args.depth, args.years, args.files,
+                seed=args.seed
+            )
+
+            for name, run in benchmarksFor(path, start, end):
+
+                if args.only is not None and name not in args.only:
+                    continue
+
+                times = bestOf(args.repeat, run)
+
+                results.append({
+                    "name": name, "trades": trades, "best": min(times),
+                    "times": times
+                })
+
+                print("{:>10} {:>10} {:>12.4f}".format(name, trades, min(times)))
+
+    printScaling(results)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            printComparison(results, json.load(f))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": gitCommit(),
+                "created": datetime.datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": config,
+                "results": results
+            }, f, indent=1)
+
+if __name__ == '__main__':
+    main()
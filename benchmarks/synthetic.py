@@ -0,0 +1,129 @@
+# Writes synthetic working directories with prices, gains and income CSV files
+# for benchmarking. Trades never dispose of more of an asset than is held, so
+# every calculation succeeds.
+
+import datetime, os, random
+from decimal import Decimal
+
+START = datetime.date(2010, 1, 1)
+
+def assetNames(assets):
+    return ["tok{}".format(i) for i in range(assets)]
+
+def chainNames(chainDepth, reportAsset):
+    # The assets that token prices are quoted in, ending with the reporting
+    # asset
+    return ["link{}".format(i) for i in range(1, chainDepth)] + [reportAsset]
+
+def writePrices(path, names, chain, days, rand):
+
+    quoted = {name: chain[0] for name in names}
+
+    for i, link in enumerate(chain[:-1]):
+        quoted[link] = chain[i + 1]
+
+    for asset, quote in quoted.items():
+
+        with open("{}/{}_{}.csv".format(path, asset, quote), "w") as f:
+
+            f.write("DATE,PRICE\n")
+            price = rand.uniform(1, 1000)
+
+            for day in range(days):
+                price *= rand.uniform(0.95, 1.05)
+                f.write("{},{:.6f}\n".format(
+                    (START + datetime.timedelta(days=day)).isoformat(), price
+                ))
+
+def writeGains(path, names, reportAsset, trades, days, files, rand):
+
+    # Trades are spread over the files, each of which is in date order as an
+    # export from one exchange would be
+
+    outs = [
+        open("{}/exchange{}.csv".format(path, i), "w") for i in range(files)
+    ]
+
+    try:
+
+        for f in outs:
+            f.write("DATE,SELL ASSET,SELL AMOUNT,BUY ASSET,BUY AMOUNT\n")
+
+        holdings = {name: Decimal(0) for name in names}
+
+        for n in range(trades):
+
+            date = (START + datetime.timedelta(days=n * days // trades)).isoformat()
+            f = outs[rand.randrange(files)]
+
+            buy = rand.choice(names)
+            sell = rand.choice(names)
+            amount = Decimal(rand.randint(1, 100000)) / 100
+
+            if sell == buy or holdings[sell] < 1 or rand.random() < 0.4:
+                # Buy with the reporting asset
+                f.write("{},{},{},{},{}\n".format(
+                    date, reportAsset, Decimal(rand.randint(1, 1000000)) / 100,
+                    buy, amount
+                ))
+                holdings[buy] += amount
+                continue
+
+            sellAmount = min(holdings[sell], Decimal(rand.randint(1, 100000)) / 100)
+            holdings[sell] -= sellAmount
+
+            if rand.random() < 0.5:
+                # Sell for the reporting asset
+                f.write("{},{},{},{},{}\n".format(
+                    date, sell, sellAmount, reportAsset,
+                    Decimal(rand.randint(1, 1000000)) / 100
+                ))
+            else:
+                # Exchange one token for another
+                f.write("{},{},{},{},{}\n".format(
+                    date, sell, sellAmount, buy, amount
+                ))
+                holdings[buy] += amount
+
+    finally:
+        for f in outs:
+            f.close()
+
+def writeIncome(path, names, rows, days, rand):
+
+    with open(path + "/income.csv", "w") as f:
+
+        f.write("DATE,ASSET,AMOUNT,NOTE\n")
+
+        for n in range(rows):
+            f.write("{},{},{},payment {}\n".format(
+                (START + datetime.timedelta(days=n * days // rows)).isoformat(),
+                rand.choice(names), Decimal(rand.randint(-10000, 100000)) / 100,
+                n
+            ))
+
+def writeWorkingDir(
+    path, trades=10000, assets=10, chainDepth=1, years=2, files=1,
+    incomeRows=None, reportAsset="gbp", seed=0
+):
+
+    # Writes the prices, gains and income directories under path. Token prices
+    # are quoted through chainDepth assets to the reporting asset. There is one
+    # income row for every ten trades unless incomeRows is given. Returns the
+    # first and last dates of the data.
+
+    rand = random.Random(seed)
+    names = assetNames(assets)
+    days = years * 365
+
+    for d in ("prices", "gains", "income"):
+        os.makedirs(path + "/" + d, exist_ok=True)
+
+    writePrices(path + "/prices", names, chainNames(chainDepth, reportAsset), days, rand)
+    writeGains(path + "/gains", names, reportAsset, trades, days, files, rand)
+    writeIncome(
+        path + "/income", names,
+        max(1, trades // 10) if incomeRows is None else incomeRows, days, rand
+    )
+
+    return START, START + datetime.timedelta(days=days - 1)
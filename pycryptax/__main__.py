@@ -1,8 +1,11 @@
 # Copyright 2019 Matthew Mitchell
 
-import argparse, sys
+import argparse, sqlite3, sys
+from concurrent import futures
+import contextlib
 from contextlib import contextmanager
-from pycryptax import csvdata, prices, income, gains, util
+from pycryptax import csvdata, prices, income, gains, util, cache, columnar, \
+    checkpoint, timings, output, server, database, binprices
 
 GAINS_DIR = "/gains"
 INCOME_DIR = "/income"
@@ -38,6 +41,11 @@ def csvErrorHandler(what, directory, reportAsset):
 
     try:
         yield
+    except database.DataNotImported:
+        fail(
+            "The database has no {} imported. Use the 'import' command first"
+            .format(what)
+        )
     except FileNotFoundError:
         fail(
             "You need to provide {} in the {} directory".format(what, directory)
@@ -56,6 +64,8 @@ def csvErrorHandler(what, directory, reportAsset):
 "A non numeric value found in {} on line {} where a number is expected"
             .format(e.filename, e.line)
         )
+    except binprices.BinaryPricesError as e:
+        fail("Cannot use the binary price file {}".format(e))
     except prices.AssetPricesNotFound as e:
         fail("""\
 Cannot find a {1} price for {0}. Please provide a {0}_{1}.csv file in the \
@@ -66,6 +76,56 @@ prices directory""".format(e.asset, reportAsset))
             .format(e.asset, util.getPrettyDate(e.date))
         )
 
+def serve(args, priceData, parseCache, executor, db):
+
+    # Gains and income are loaded once if they are provided, and kept for
+    # every query. With a database they are read from it for each query.
+
+    reportAsset = args.reportingcurrency
+    data = {}
+
+    for name, what, directory, load in (
+        ("gains", "capital gains information", GAINS_DIR, csvdata.CSVGains),
+        ("income", "income information", INCOME_DIR, csvdata.CSVIncome)
+    ):
+        with csvErrorHandler(what, args.dir + directory, reportAsset):
+            try:
+                if db is not None:
+                    data[name] = db.gainData() if name == "gains" \
+                        else db.incomeData()
+                else:
+                    data[name] = load(args.dir + directory, parseCache, executor)
+            except FileNotFoundError:
+                # Queries needing this data are answered with an error
+                data[name] = None
+
+    service = server.Service(priceData, data["gains"], data["income"])
+
+    try:
+        httpServer = server.makeServer(service, args.listen)
+    except (OSError, ValueError) as e:
+        fail("Cannot listen on {}: {}".format(args.listen, e))
+
+    if args.poll is not None:
+        server.pollReloads(service, args.poll)
+
+    print("Serving on {}".format(args.listen), file=sys.stderr)
+
+    try:
+        httpServer.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpServer.server_close()
+        if executor is not None:
+            executor.shutdown()
+
+def writeTimings(path, runTimings):
+    if path == "-":
+        runTimings.report()
+    else:
+        runTimings.save(path)
+
 def main():
 
     # Arguments
@@ -90,14 +150,32 @@ losses, and a summary of current section 104 holdings.
 
 Use the 'disposals' command to output a list of asset disposal
 information to CSV.
+
+Use the 'serve' command to load the data once and answer queries for
+the other commands over HTTP, for example
+GET /gain?start=2019-04-06&end=2020-04-05
+
+Use the 'import' command with --database to import the CSV files into
+a SQLite database, which the other commands then read with --database.
+
+Use the 'convertprices' command to write a binary copy of each price
+file, which is used instead of the CSV file until the CSV file changes.
         """
     )
 
     parser.add_argument(
-        "action", choices=["income", "txs", "gain", "disposals"]
+        "action",
+        choices=[
+            "income", "txs", "gain", "disposals", "serve", "import",
+            "convertprices"
+        ]
+    )
+    parser.add_argument(
+        "start", type=str, nargs="?", help="Starting date of calculation"
+    )
+    parser.add_argument(
+        "end", type=str, nargs="?", help="End date of calculation"
     )
-    parser.add_argument("start", type=str, help="Starting date of calculation")
-    parser.add_argument("end", type=str, help="End date of calculation")
     parser.add_argument(
         "--reportingcurrency", "-c", type=str, default="gbp",
         help="The reporting currency (default \"gbp\") to present calculations"
@@ -106,46 +184,268 @@ information to CSV.
         "--dir", "-d", type=str, default="./",
         help="The root directory of the CSV data (default \"./\")"
     )
+    parser.add_argument(
+        "--cachedir", type=str, default=None,
+        help="A directory to cache parsed CSV data in, so that unchanged files \
+are not parsed again on later runs (default none)"
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="The number of processes used to parse CSV files (default 1)"
+    )
+
+    parser.add_argument(
+        "--columnar", action="store_true",
+        help="Hold price data in NumPy arrays, which requires NumPy"
+    )
+
+    parser.add_argument(
+        "--database", type=str, default=None, metavar="PATH",
+        help="A SQLite database to read prices, gains and income from instead \
+of the CSV files, after importing them with the 'import' command"
+    )
+
+    parser.add_argument(
+        "--period", "-p", type=str, nargs=2, action="append", default=[],
+        metavar=("START", "END"),
+        help="An additional period to calculate, which may be given many times. \
+All periods are calculated together from a single pass over the data."
+    )
+
+    parser.add_argument(
+        "--checkpoint", type=str, default=None, metavar="PATH",
+        help="Resume capital gain calculations from a checkpoint file saved \
+with --savecheckpoint. Periods must start after the checkpoint date."
+    )
+    parser.add_argument(
+        "--savecheckpoint", type=str, nargs=2, default=None,
+        metavar=("DATE", "PATH"),
+        help="Save the section 104 holdings at the end of DATE to a checkpoint \
+file, so that later calculations can skip earlier trades"
+    )
+
+    parser.add_argument(
+        "--output", "-o", type=str, default=None, metavar="PATH",
+        help="Write the output to a file instead of stdout. The file is \
+compressed with gzip if PATH ends in .gz"
+    )
+
+    parser.add_argument(
+        "--listen", type=str, default=server.DEFAULT_ADDRESS,
+        metavar="ADDRESS",
+        help="The address the 'serve' command listens on, as HOST:PORT or \
+unix:PATH for a Unix socket (default \"{}\")".format(server.DEFAULT_ADDRESS)
+    )
+
+    parser.add_argument(
+        "--poll", type=float, default=None, metavar="SECONDS",
+        help="Have the 'serve' command check for changed data files every \
+SECONDS and read only the files that changed. They can also be reloaded with \
+POST /reload"
+    )
+
+    parser.add_argument(
+        "--timings", type=str, nargs="?", const="-", default=None,
+        metavar="PATH",
+        help="Report the time spent in each phase and counts of work done. The \
+report is written to stderr, or as JSON to PATH if given."
+    )
 
     args = parser.parse_args()
 
+    if args.action not in ("serve", "import", "convertprices") \
+            and (args.start is None or args.end is None):
+        parser.error("the start and end dates are required")
+
+    if args.action == "import" and args.database is None:
+        parser.error("the import command requires --database")
+
     reportAsset = args.reportingcurrency
     action = args.action
     rootDir = args.dir
-    start = util.dateFromString(args.start)
-    end = util.dateFromString(args.end)
+    start = util.dateFromString(args.start) if args.start else None
+    end = util.dateFromString(args.end) if args.end else None
+    extraPeriods = [
+        (util.dateFromString(s), util.dateFromString(e)) for s, e in args.period
+    ]
+    parseCache = cache.ParseCache(args.cachedir) if args.cachedir else None
+    executor = futures.ProcessPoolExecutor(args.jobs) if args.jobs > 1 else None
+    runTimings = timings.Timings() if args.timings is not None else None
+
+    def phase(name):
+        if runTimings is None:
+            return contextlib.nullcontext()
+        return runTimings.phase(name)
+
+    if args.columnar and not columnar.available():
+        fail("The --columnar option requires NumPy to be installed")
+
+    db = None
+
+    if args.database is not None:
+        try:
+            db = database.Database(args.database)
+        except sqlite3.Error as e:
+            fail("Cannot open the database {}: {}".format(args.database, e))
+
+    if action == "convertprices":
+
+        with csvErrorHandler("prices", rootDir + PRICES_DIR, reportAsset):
+            files, count = prices.convertToBinary(rootDir + PRICES_DIR)
+
+        print(
+            "Converted {} prices in {} files".format(count, files),
+            file=sys.stderr
+        )
+        return
+
+    if action == "import":
+
+        with csvErrorHandler("prices", rootDir + PRICES_DIR, reportAsset), \
+                phase("import"):
+            counts = db.importDir(rootDir, parseCache, executor, runTimings)
+
+        print(
+            "Imported {prices} prices, {gains} trades and {income} income "
+            "transactions into {0}".format(args.database, **counts),
+            file=sys.stderr
+        )
+
+        if executor is not None:
+            executor.shutdown()
+
+        if runTimings is not None:
+            writeTimings(args.timings, runTimings)
+
+        return
 
     # Load price data
-    with csvErrorHandler("prices", rootDir + PRICES_DIR, reportAsset):
-        priceData = prices.Prices(reportAsset, rootDir + PRICES_DIR)
+    with csvErrorHandler("prices", rootDir + PRICES_DIR, reportAsset), \
+            phase("load prices"):
+        if db is not None:
+            priceData = db.priceData(reportAsset, useColumnar=args.columnar)
+        else:
+            priceData = prices.Prices(
+                reportAsset, rootDir + PRICES_DIR, parseCache, executor,
+                useColumnar=args.columnar, timings=runTimings
+            )
+
+    if action == "serve":
+        serve(args, priceData, parseCache, executor, db)
+        return
+
+    resume = None
+    checkpointDate = None
+
+    if args.checkpoint is not None:
+        try:
+            resume = checkpoint.Checkpoint.load(args.checkpoint)
+        except (OSError, ValueError, KeyError, checkpoint.StaleCheckpoint):
+            fail("Cannot read the checkpoint file {}".format(args.checkpoint))
+
+    if args.savecheckpoint is not None:
+        checkpointDate = util.dateFromString(args.savecheckpoint[0])
 
     def getCGCalc(**kwargs):
+
         with csvErrorHandler(
             "capital gains information", rootDir + GAINS_DIR, reportAsset
-        ):
-            return gains.CapitalGainCalculator(
-                csvdata.CSVGains(rootDir + GAINS_DIR), priceData, start, end,
-                **kwargs
-            )
+        ), phase("read gains"):
+            try:
+                calc = gains.CapitalGainCalculator(
+                    db.gainData() if db is not None
+                    else csvdata.CSVGains.stream(
+                        rootDir + GAINS_DIR, True, parseCache, executor,
+                        runTimings
+                    ),
+                    priceData, start, end, extraPeriods=extraPeriods,
+                    resume=resume, checkpointDate=checkpointDate,
+                    timings=runTimings, **kwargs
+                )
+            except checkpoint.StaleCheckpoint:
+                fail("""\
+The checkpoint {} is out of date as trades or prices up to 30 days after it have \
+changed. Please save a new checkpoint.""".format(args.checkpoint))
+            except checkpoint.CheckpointTooLate as e:
+                fail(
+                    "Calculation periods must start after the checkpoint date {}"
+                    .format(util.getPrettyDate(e.date))
+                )
+
+        if checkpointDate is not None:
+            calc.checkpoint().save(args.savecheckpoint[1])
 
-    def getIncomeCalc():
+        return calc
+
+    def getIncomeCalcs():
         with csvErrorHandler("income information", rootDir + INCOME_DIR, reportAsset):
-            return income.IncomeCalculator(
-                csvdata.CSVIncome(rootDir + INCOME_DIR), priceData, start, end
-            )
 
-    if action == "income":
-        print(BEFORE_MSG)
-        getIncomeCalc().printSummary()
-        print(AFTER_MSG)
-    elif action == "txs":
-        getIncomeCalc().printTxs()
-    elif action == "gain":
-        print(BEFORE_MSG)
-        getCGCalc(summary=True).printSummary()
-        print(AFTER_MSG)
-    elif action == "disposals":
-        getCGCalc(disposals=True).printDisposals()
+            with phase("read income"):
+                if db is not None:
+                    incomeData = db.incomeData()
+                else:
+                    incomeData = csvdata.CSVIncome(
+                        rootDir + INCOME_DIR, parseCache, executor, runTimings
+                    )
+
+            return [
+                income.IncomeCalculator(
+                    incomeData, priceData, periodStart, periodEnd, runTimings
+                )
+                for periodStart, periodEnd in [(start, end)] + extraPeriods
+            ]
+
+    out = None
+
+    if args.output is not None:
+        try:
+            out = output.openOutput(args.output)
+        except OSError:
+            fail("Cannot open the output file {}".format(args.output))
+
+    try:
+
+        if action == "income":
+            print(BEFORE_MSG, file=out)
+            calcs = getIncomeCalcs()
+            with phase("output"):
+                for calc in calcs:
+                    calc.printSummary(out)
+            print(AFTER_MSG, file=out)
+        elif action == "txs":
+            calcs = getIncomeCalcs()
+            with phase("output"):
+                for i, calc in enumerate(calcs):
+                    if i > 0:
+                        print(file=out)
+                    calc.printTxs(out)
+        elif action == "gain":
+            print(BEFORE_MSG, file=out)
+            calc = getCGCalc(summary=True)
+            with phase("output"):
+                calc.printSummary(out)
+            print(AFTER_MSG, file=out)
+        elif action == "disposals":
+            calc = getCGCalc(disposals=True)
+            with phase("output"):
+                calc.printDisposals(out)
+
+    finally:
+        if out is not None:
+            out.close()
+
+    if executor is not None:
+        executor.shutdown()
+
+    if runTimings is not None:
+
+        runTimings.count("price get calls", priceData.getCalls())
+        runTimings.count("price memo hits", priceData.memoHits())
+        runTimings.count("price memo misses", priceData.memoMisses())
+        runTimings.count("price batch lookups", priceData.batchLookups())
+        runTimings.count("price bisects", priceData.bisects())
+
+        writeTimings(args.timings, runTimings)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,168 @@
+import bisect, mmap, os, struct, sys
+from array import array
+from decimal import Decimal
+from pycryptax import csvdata, util
+
+# A compact binary format for price files, read through mmap so that startup
+# does not parse anything and processes reading the same file share its pages.
+#
+# After the header come three columns of count entries, each little-endian:
+# the times as int64 microseconds since 0001-01-01, then the price of each time
+# as an int64 coefficient and an int8 decimal exponent, so that prices are read
+# back as the same Decimals. The header records the size and modification time
+# of the CSV file converted, so that a binary file older than its CSV file is
+# not used.
+
+MAGIC = b"PCXPRICE"
+VERSION = 1
+
+# magic, version, count, source CSV size and modification time
+HEADER = struct.Struct("<8sI4xqqq")
+
+# The bytes of a time, a coefficient and an exponent
+ENTRY_SIZE = 8 + 8 + 1
+
+class BinaryPricesError(Exception):
+    def __init__(self, filename, reason):
+        super().__init__("{}: {}".format(filename, reason))
+        self.filename = filename
+        self.reason = reason
+
+def encodePrice(filename, price):
+
+    sign, digits, exp = price.as_tuple()
+
+    if not isinstance(exp, int) or not -128 <= exp <= 127:
+        raise BinaryPricesError(filename, "cannot store the price {}".format(price))
+
+    coef = int("".join(map(str, digits)))
+
+    if coef >= 1 << 63:
+        raise BinaryPricesError(filename, "cannot store the price {}".format(price))
+
+    return -coef if sign else coef, exp
+
+def littleEndian(column):
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+def convert(csvFilename, binFilename):
+
+    # Writes the prices of a price CSV file to a binary file. Returns the number
+    # of prices.
+
+    stat = os.stat(csvFilename)
+    csvPrices = csvdata.CSVPrices(csvFilename, None)
+
+    times = csvPrices.timeKeys()
+    coefs = array("q")
+    exps = array("b")
+
+    for price in csvPrices.values():
+        coef, exp = encodePrice(csvFilename, price)
+        coefs.append(coef)
+        exps.append(exp)
+
+    tmp = "{}.{}.tmp".format(binFilename, os.getpid())
+
+    try:
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, len(times), stat.st_size, stat.st_mtime_ns
+            ))
+            f.write(littleEndian(times))
+            f.write(littleEndian(coefs))
+            f.write(littleEndian(exps))
+        os.replace(tmp, binFilename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return len(times)
+
+def readHeader(f, filename):
+
+    header = f.read(HEADER.size)
+
+    if len(header) != HEADER.size:
+        raise BinaryPricesError(filename, "not a binary price file")
+
+    magic, version, count, sourceSize, sourceMtime = HEADER.unpack(header)
+
+    if magic != MAGIC or version != VERSION:
+        raise BinaryPricesError(filename, "not a binary price file")
+
+    return count, sourceSize, sourceMtime
+
+def isCurrent(binFilename, csvFilename):
+
+    # True if the binary file was converted from the CSV file as it is now
+
+    try:
+        with open(binFilename, "rb") as f:
+            count, sourceSize, sourceMtime = readHeader(f, binFilename)
+        stat = os.stat(csvFilename)
+    except (OSError, BinaryPricesError):
+        return False
+
+    return (sourceSize, sourceMtime) == (stat.st_size, stat.st_mtime_ns)
+
+class MappedPrices():
+
+    # The prices of a binary price file, searched directly in the mapped file
+
+    def __init__(self, filename, quoted):
+
+        if sys.byteorder != "little":
+            raise BinaryPricesError(
+                filename, "binary price files need a little-endian system"
+            )
+
+        try:
+            with open(filename, "rb") as f:
+                count, sourceSize, sourceMtime = readHeader(f, filename)
+                size = os.fstat(f.fileno()).st_size
+                if size != HEADER.size + count * ENTRY_SIZE:
+                    raise BinaryPricesError(filename, "the file is truncated")
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            raise BinaryPricesError(filename, str(e))
+
+        view = memoryview(self._map)
+        coefStart = HEADER.size + count * 8
+        expStart = coefStart + count * 8
+
+        self._times = view[HEADER.size:coefStart].cast("q")
+        self._coefs = view[coefStart:expStart].cast("q")
+        self._exps = view[expStart:].cast("b")
+        self._quoted = quoted
+
+    def __len__(self):
+        return len(self._times)
+
+    def quotedAsset(self):
+        return self._quoted
+
+    def _value(self, i):
+        return Decimal(self._coefs[i]).scaleb(self._exps[i])
+
+    def firstDate(self):
+        return util.dateOfKey(self._times[0]) if len(self._times) else None
+
+    def valueAt(self, key):
+
+        # The price at the latest time no later than the time key, or None if
+        # there is none
+
+        i = bisect.bisect_right(self._times, key) - 1
+        return self._value(i) if i >= 0 else None
+
+    def timeKeys(self):
+        return self._times
+
+    def dates(self):
+        return [util.dateOfKey(key) for key in self._times]
+
+    def values(self):
+        return [self._value(i) for i in range(len(self._times))]
@@ -0,0 +1,120 @@
+import hashlib, os, pickle
+
+# Increase when the layout of cached rows changes so old entries are ignored
+FORMAT_VERSION = 5
+
+HASH_CHUNK = 1 << 20
+
+def fingerprint(filename):
+
+    st = os.stat(filename)
+    h = hashlib.sha256()
+
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+
+    return (st.st_size, st.st_mtime_ns, h.hexdigest())
+
+# Stores the parsed rows of CSV files on disk so that unchanged files do not
+# need to be parsed again. The rows are given as flat columns, such as arrays of
+# time keys, which load much faster than the row objects themselves. Entries
+# are keyed by the kind of data, the file path, its size, modification time and
+# a hash of its content. Entries also record where reading ended so that rows
+# appended to a file since can be read alone.
+
+class ParseCache():
+
+    def __init__(self, cacheDir):
+        self._dir = cacheDir
+        os.makedirs(cacheDir, exist_ok=True)
+
+    def _entryPath(self, kind, filename):
+        key = "{}:{}".format(kind, os.path.abspath(filename))
+        return os.path.join(
+            self._dir, hashlib.sha1(key.encode()).hexdigest() + ".cache"
+        )
+
+    def _openEntry(self, kind, filename):
+
+        # Returns the open entry file and its fingerprint and read position,
+        # leaving the rows to be read, or None
+
+        try:
+            f = open(self._entryPath(kind, filename), "rb")
+        except OSError:
+            return None
+
+        try:
+            version, path, fp, position = pickle.load(f)
+            if version == FORMAT_VERSION and path == os.path.abspath(filename):
+                return f, tuple(fp), position
+        except Exception:
+            pass
+
+        f.close()
+        return None
+
+    def _loadColumns(self, entry):
+
+        f, fp, position = entry
+
+        with f:
+            try:
+                return pickle.load(f), position
+            except Exception:
+                return None
+
+    def load(self, kind, filename, fp):
+
+        # Returns (columns, read position) cached for the file, or None if
+        # there are none or they were made from a different version of the
+        # file. Missing, unreadable or corrupt entries are treated as a miss.
+
+        entry = self._openEntry(kind, filename)
+
+        if entry is None:
+            return None
+
+        if entry[1] != fp:
+            entry[0].close()
+            return None
+
+        return self._loadColumns(entry)
+
+    def loadPrefix(self, kind, filename, isPrefix):
+
+        # Returns (columns, read position) cached for an earlier version of the
+        # file if isPrefix(position) is True, so that only the rows added
+        # since need to be read, or None
+
+        entry = self._openEntry(kind, filename)
+
+        if entry is None:
+            return None
+
+        if not isPrefix(entry[2]):
+            entry[0].close()
+            return None
+
+        return self._loadColumns(entry)
+
+    def store(self, kind, filename, fp, columns, position):
+
+        entry = self._entryPath(kind, filename)
+        tmp = "{}.{}.tmp".format(entry, os.getpid())
+
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(
+                    (FORMAT_VERSION, os.path.abspath(filename), fp, position), f,
+                    pickle.HIGHEST_PROTOCOL
+                )
+                pickle.dump(columns, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, entry)
+        except OSError:
+            # The cache is only an optimisation so failing to write is fine
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -0,0 +1,123 @@
+import datetime, hashlib, json
+from decimal import Decimal
+from pycryptax import util
+
+FORMAT_VERSION = 2
+
+# Disposals can be matched to acquisitions up to this many days later, so data
+# this far beyond a checkpoint affects the state saved in it
+MATCH_DAYS = 30
+
+class StaleCheckpoint(Exception):
+    pass
+
+class CheckpointTooLate(Exception):
+    def __init__(self, date):
+        self.date = date
+
+def limitOf(date):
+    # The last time of which the trades and prices affect a checkpoint
+    return util.endOfDay(date + datetime.timedelta(days=MATCH_DAYS))
+
+class GainsDigest():
+
+    # A hash of the gains rows given to add(), which does not depend on the
+    # order in which they are given, so that rows can be read from the CSV
+    # files or the database
+
+    def __init__(self):
+        self._total = 0
+
+    def add(self, date, tx):
+        self._total += int.from_bytes(hashlib.sha256("{}|{}|{}|{}|{}".format(
+            date.isoformat(" ", "microseconds"), tx.sellAsset or "",
+            "" if tx.sellAmount is None else tx.sellAmount,
+            tx.buyAsset or "", "" if tx.buyAmount is None else tx.buyAmount
+        ).encode()).digest(), "big")
+
+    def hexdigest(self):
+        return "{:064x}".format(self._total % (1 << 256))
+
+def digestOf(reportAsset, gainsDigest, priceData, limit):
+
+    # A hash of the gains rows and prices up to the limit. If earlier trades or
+    # prices change, so does the digest. Later ones can be added freely.
+
+    h = hashlib.sha256("{}|{}\n".format(
+        reportAsset, gainsDigest.hexdigest()
+    ).encode())
+
+    for asset, quoted, keys, values in priceData.pricesUpTo(limit):
+        h.update("{}|{}\n".format(asset, quoted).encode())
+        h.update("".join(
+            "{}|{}\n".format(key, value) for key, value in zip(keys, values)
+        ).encode())
+
+    return h.hexdigest()
+
+class Checkpoint():
+
+    # The section 104 holdings at the end of a date, and the amounts of later
+    # acquisitions already matched to disposals up to that date under the
+    # 30-day rule, in the order they were matched
+
+    def __init__(self, date, reportAsset, digest, assets, pools, consumed):
+        self.date = date
+        self.reportAsset = reportAsset
+        self.digest = digest
+        # The assets first traded on or before the date, in the order they are
+        # reported
+        self.assets = assets
+        # {asset: (quantity, cost)}
+        self.pools = pools
+        # [(asset, date, amount, cost)]
+        self.consumed = consumed
+
+    def verify(self, reportAsset, digest):
+        if reportAsset != self.reportAsset or digest != self.digest:
+            raise StaleCheckpoint
+
+    def save(self, filename):
+
+        data = {
+            "version": FORMAT_VERSION,
+            "date": self.date.strftime(util.ISO_FORMAT),
+            "reportAsset": self.reportAsset,
+            "digest": self.digest,
+            "assets": self.assets,
+            "pools": [
+                [asset, str(quantity), str(cost)]
+                for asset, (quantity, cost) in self.pools.items()
+            ],
+            "consumed": [
+                [asset, date.strftime(util.ISO_FORMAT), str(amount), str(cost)]
+                for asset, date, amount, cost in self.consumed
+            ]
+        }
+
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=1)
+
+    @classmethod
+    def load(cls, filename):
+
+        with open(filename) as f:
+            data = json.load(f)
+
+        if data.get("version") != FORMAT_VERSION:
+            raise StaleCheckpoint
+
+        return cls(
+            util.dateFromString(data["date"]),
+            data["reportAsset"],
+            data["digest"],
+            data["assets"],
+            {
+                asset: (Decimal(quantity), Decimal(cost))
+                for asset, quantity, cost in data["pools"]
+            },
+            [
+                (asset, util.dateFromString(date), Decimal(amount), Decimal(cost))
+                for asset, date, amount, cost in data["consumed"]
+            ]
+        )
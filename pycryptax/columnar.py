@@ -0,0 +1,108 @@
+from decimal import Decimal
+from pycryptax import util
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class NumpyNotAvailable(Exception):
+    pass
+
+def available():
+    return numpy is not None
+
+def timeKeys(dates):
+    return numpy.fromiter(
+        (util.timeKey(d) for d in dates), dtype=numpy.int64, count=len(dates)
+    )
+
+def encodeDecimals(values):
+
+    # Prices are kept exactly as a coefficient and decimal exponent. If a
+    # coefficient does not fit in 64 bits, or there is a NaN or infinity, the
+    # Decimal objects are kept instead.
+
+    coefs = numpy.empty(len(values), dtype=numpy.int64)
+    exps = numpy.empty(len(values), dtype=numpy.int8)
+
+    for i, v in enumerate(values):
+
+        sign, digits, exp = v.as_tuple()
+
+        if not isinstance(exp, int) or not -128 <= exp <= 127:
+            return numpy.array(values, dtype=object), None
+
+        coef = int("".join(map(str, digits)))
+
+        if coef >= 1 << 63:
+            return numpy.array(values, dtype=object), None
+
+        coefs[i] = -coef if sign else coef
+        exps[i] = exp
+
+    return coefs, exps
+
+class ColumnarPrices():
+
+    # A price series held in NumPy arrays, with dates as util.timeKey() keys.
+    # Whole arrays of dates can be looked up with a single searchsorted call.
+    # The dates may be given as keys instead.
+
+    def __init__(self, dates, values, quoted=None, keys=None):
+
+        if numpy is None:
+            raise NumpyNotAvailable
+
+        self._dates = timeKeys(dates) if keys is None \
+            else numpy.array(keys, dtype=numpy.int64)
+        self._coefs, self._exps = encodeDecimals(values)
+        self._quoted = quoted
+
+    def _value(self, i):
+
+        if self._exps is None:
+            return self._coefs[i]
+
+        return Decimal(int(self._coefs[i])).scaleb(int(self._exps[i]))
+
+    def _indexes(self, keys):
+        return numpy.searchsorted(self._dates, keys, side="right") - 1
+
+    def quotedAsset(self):
+        return self._quoted
+
+    def get(self, date):
+
+        # Returns the price at the soonest earlier date or None if there is no
+        # earlier price
+
+        i = int(self._indexes(util.timeKey(date)))
+        return self._value(i) if i >= 0 else None
+
+    def getMany(self, dates):
+        return [
+            self._value(i) if i >= 0 else None
+            for i in self._indexes(timeKeys(dates)).tolist()
+        ]
+
+    def __getitem__(self, date):
+
+        value = self.get(date)
+
+        if value is None:
+            raise KeyError
+
+        return value
+
+    def timeKeys(self):
+        return self._dates.tolist()
+
+    def dates(self):
+        return [util.dateOfKey(key) for key in self._dates.tolist()]
+
+    def values(self):
+        return [self._value(i) for i in range(len(self))]
+
+    def __len__(self):
+        return len(self._dates)
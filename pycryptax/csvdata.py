@@ -1,6 +1,7 @@
-import csv, bisect, os
+import array, csv, bisect, collections, functools, hashlib, itertools, operator
+import os, sys
 from decimal import Decimal, InvalidOperation
-from pycryptax import util, datemap
+from pycryptax import util, datemap, cache
 
 class CSVNotOpenable(Exception):
     pass
@@ -20,15 +21,142 @@ class CSVNumberError(ValueError):
         self.filename = filename
         self.line = line
 
-def getDateFromRow(row):
-    return util.dateFromString(row["DATE"])
+# The number of files parsed ahead of the rows being read when streaming with
+# an executor
+STREAM_FILES_AHEAD = 4
+
+# Up to this many appended rows are inserted into a reloaded map in place
+# rather than rebuilding it
+RELOAD_INSERT_LIMIT = 1000
+
+# The number of characters used to detect the CSV dialect of a file
+SNIFF_SIZE = 1024
 
 def isEmpty(v):
     return not v or v.isspace()
 
+def listFiles(path, requireDir):
+
+    if os.path.isdir(path) != requireDir:
+        raise FileNotFoundError
+
+    if not requireDir:
+        return [path]
+
+    # Sorted so that rows on the same date from different files have the same
+    # order on every system
+    return [path + "/" + f for f in sorted(os.listdir(path))]
+
+def fileStat(filename):
+    # Changes when a file is written or replaced. Used to find files that need
+    # to be read again on reload.
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+def prefixCheck(filename, offset):
+
+    # A hash of all of the bytes of the file before offset, or None if the
+    # file does not end a line at offset
+
+    h = hashlib.sha256()
+    remaining = offset
+    last = b""
+
+    with open(filename, "rb") as f:
+        while remaining:
+            last = f.read(min(remaining, cache.HASH_CHUNK))
+            if not last:
+                return None
+            h.update(last)
+            remaining -= len(last)
+
+    if not last.endswith(b"\n"):
+        return None
+
+    return h.hexdigest()
+
+class ReadPosition():
+
+    # Where reading of a file ended, so that rows appended to it later can be
+    # read without reading the whole file again. line is the number of rows
+    # read and dateSample the date used to choose the date format. check is the
+    # prefixCheck() of the bytes read, or None when appended rows cannot be
+    # read alone.
+
+    __slots__ = ("offset", "line", "dateSample", "check")
+
+    def __init__(self, offset=0, line=0, dateSample=None, check=None):
+        self.offset = offset
+        self.line = line
+        self.dateSample = dateSample
+        self.check = check
+
+    def copy(self):
+        return ReadPosition(self.offset, self.line, self.dateSample, self.check)
+
+    def isPrefixOf(self, filename):
+
+        # True if the file is the file that was read with only rows appended.
+        # A file that has not grown is read again in full, as any change to it
+        # must be to rows already read.
+
+        if self.check is None:
+            return False
+
+        try:
+            return os.stat(filename).st_size > self.offset \
+                and prefixCheck(filename, self.offset) == self.check
+        except OSError:
+            return False
+
+# Cached rows are stored as columns that are quick to load: times as integer
+# keys, amounts as text and asset names as indexes into a table of names
+
+def timeKeysOf(dates):
+    return array.array("q", map(util.timeKey, dates))
+
+def datesOf(keys):
+    # Rows share one date object for each time, as they do when parsed
+    dates = {key: util.dateOfKey(key) for key in set(keys)}
+    return list(map(dates.__getitem__, keys))
+
+def amountsText(amounts):
+    return "".join("\n" if a is None else str(a) + "\n" for a in amounts)
+
+def amountsOf(text):
+    return [Decimal(s) if s else None for s in text.split("\n")[:-1]]
+
+def assetIndexes(assets):
+
+    # (names, indexes) of the assets, with -1 for a missing asset
+
+    names = {}
+    indexes = array.array("i", (
+        -1 if asset is None else names.setdefault(asset, len(names))
+        for asset in assets
+    ))
+
+    return list(names), indexes
+
+def assetsOf(names, indexes):
+    # The index -1 gives the None at the end
+    names = [sys.intern(name) for name in names] + [None]
+    return list(map(names.__getitem__, indexes))
+
+def readRows(cls, parseCache, filename):
+    # Module level so that it can be sent to a worker process. Returns the rows
+    # and read position of the file.
+    rows, position = cls._readFile(filename, parseCache)
+    return list(rows), position
+
 class CSVDateMap(datemap.DateMap):
 
-    def _processFile(self, filename):
+    @classmethod
+    def _processFile(cls, filename, position=None):
+
+        # Yields the (date, row) pairs of the file. If position is given, rows
+        # are read from its offset and it is moved to where reading ended once
+        # every row has been read.
 
         try:
             f = open(filename, newline='')
@@ -39,12 +167,29 @@ class CSVDateMap(datemap.DateMap):
 
         with f:
 
-            dialect = csv.Sniffer().sniff(f.read(1024))
+            sample = f.read(SNIFF_SIZE)
+            dialect = csv.Sniffer().sniff(sample)
             f.seek(0)
 
             reader = csv.DictReader(f, dialect=dialect)
 
-            for line, row in enumerate(reader):
+            # Chosen from the first date, as files use a single date format
+            parseDate = None
+            dateSample = None
+            start = 0
+
+            if position is not None and position.offset:
+                # Read the header before moving to the rows not yet read
+                reader.fieldnames
+                f.seek(position.offset)
+                start = position.line
+                dateSample = position.dateSample
+                if dateSample is not None:
+                    parseDate = util.dateParserFor(dateSample)
+
+            line = start + 1
+
+            for line, row in enumerate(reader, start):
 
                 line += 2
 
@@ -53,91 +198,544 @@ class CSVDateMap(datemap.DateMap):
                     if isEmpty(row["DATE"]):
                         continue
 
+                    if parseDate is None:
+                        dateSample = row["DATE"]
+                        parseDate = util.dateParserFor(dateSample)
+
                     try:
-                        date = getDateFromRow(row)
+                        date = parseDate(row["DATE"])
                     except ValueError:
-                        raise CSVDateError(filename, row["DATE"], line)
+                        # The file may mix formats so try detecting again
+                        try:
+                            date = util.dateFromString(row["DATE"])
+                        except ValueError:
+                            raise CSVDateError(filename, row["DATE"], line)
 
-                    data = self._processRow(row)
-                    self.insert(date, data)
+                    yield date, cls._processRow(row)
 
                 except KeyError as e:
                     raise CSVKeyError(filename)
                 except InvalidOperation as e:
                     raise CSVNumberError(filename, line)
 
-    def __init__(self, path, requireDir=True):
+            if position is None:
+                return
+
+            position.line = line - 1
+            position.dateSample = dateSample
+
+            try:
+                # Allowed again once every line has been read
+                position.offset = f.tell()
+            except OSError:
+                position.check = None
+                return
+
+        # Appended rows are only read alone when the dialect was detected from
+        # a full sample, as it would be when reading the whole file again
+        position.check = prefixCheck(filename, position.offset) \
+            if len(sample) == SNIFF_SIZE else None
+
+    @classmethod
+    def _readFile(cls, filename, parseCache, position=None):
+
+        # Returns the rows of the file and its read position, which is complete
+        # once the rows have been read. Rows added since the file was cached,
+        # or since position if it is given, are read on their own when the
+        # rest of the file is unchanged. With a position only the new rows
+        # are returned.
+
+        if position is not None:
+            position = position.copy()
+            return list(cls._processFile(filename, position)), position
+
+        if parseCache is None:
+            position = ReadPosition()
+            return cls._processFile(filename, position), position
+
+        try:
+            fp = cache.fingerprint(filename)
+        except OSError:
+            # Let parsing report the problem with the file
+            position = ReadPosition()
+            return cls._processFile(filename, position), position
+
+        kind = cls.__name__
+        entry = parseCache.load(kind, filename, fp)
+
+        if entry is not None:
+            columns, position = entry
+            return cls._rowsOf(columns), position
+
+        entry = parseCache.loadPrefix(
+            kind, filename, lambda position: position.isPrefixOf(filename)
+        )
+
+        if entry is None:
+            position = ReadPosition()
+            rows = list(cls._processFile(filename, position))
+        else:
+            columns, position = entry
+            rows = cls._rowsOf(columns)
+            rows.extend(cls._processFile(filename, position))
+
+        parseCache.store(kind, filename, fp, cls._columnsOf(rows), position)
+
+        return rows, position
+
+    @classmethod
+    def _columnsOf(cls, rows):
+        # The rows in the form stored by the parse cache
+        return (
+            timeKeysOf(date for date, value in rows),
+            cls._valueColumns([value for date, value in rows])
+        )
+
+    @classmethod
+    def _rowsOf(cls, columns):
+        keys, valueColumns = columns
+        return list(zip(datesOf(keys), cls._valuesOf(valueColumns)))
+
+    def __init__(
+        self, path, requireDir=True, parseCache=None, executor=None,
+        timings=None
+    ):
 
         super().__init__()
 
-        if os.path.isdir(path) != requireDir:
-            raise FileNotFoundError
+        self._path = path
+        self._requireDir = requireDir
+        self._parseCache = parseCache
+        self._executor = executor
+
+        # The file each entry was read from, as its position in _files, so that
+        # the entries of changed files can be replaced on reload
+        self._fileIds = array.array("I")
+        self._files = listFiles(path, requireDir)
+        # {filename: fileStat()} of the files read
+        self._fileStats = {}
+        # {filename: ReadPosition} of the files read
+        self._positions = {}
+
+        # Gather rows from every file and sort once. Timsort merges the
+        # already-sorted runs of each file, avoiding a list insertion per row.
+
+        with util.gcPaused():
+
+            entries = []
+
+            for fileId, (filename, stat, rows, position) in enumerate(
+                self._readFiles(self._files, timings)
+            ):
+                entries.extend((date, value, fileId) for date, value in rows)
+                self._fileStats[filename] = stat
+                self._positions[filename] = position
+
+            entries.sort(key=operator.itemgetter(0))
+            self._setEntries(entries)
+
+    def _readFiles(self, files, timings=None):
+
+        # Yields (filename, fileStat(), rows, ReadPosition) for each file in
+        # order. The state of each file is taken before it is read so that a
+        # write during reading is found on the next reload.
+
+        stats = [fileStat(filename) for filename in files]
+        read = functools.partial(readRows, type(self), self._parseCache)
 
-        if requireDir:
-            for f in os.listdir(path):
-                self._processFile(path + "/" + f)
+        if self._executor is None or len(files) < 2:
+            fileRows = map(read, files)
         else:
-            self._processFile(path)
+            # Results are returned in the order of files, so the merge gives
+            # the same result as parsing serially. Errors are re-raised here
+            # with the file and line they occurred on.
+            fileRows = self._executor.map(read, files)
+
+        for filename, stat, (rows, position) in zip(files, stats, fileRows):
+
+            if timings is not None:
+                timings.fileRows(filename, len(rows))
+
+            yield filename, stat, rows, position
+
+    # Entries are stored by _setEntries() and _insertEntry(), and read back as
+    # (date, value, fileId) by _entries(), so that a subclass may store them
+    # in another form
+
+    def _setEntries(self, entries):
+        self._dates = [date for date, value, fileId in entries]
+        self._values = [value for date, value, fileId in entries]
+        self._fileIds = array.array(
+            "I", (fileId for date, value, fileId in entries)
+        )
+
+    def _insertEntry(self, date, value, fileId):
+
+        # After entries on the same date from the same or earlier files
+
+        lo = bisect.bisect_left(self._dates, date)
+        i = bisect.bisect_right(self._dates, date, lo)
+
+        while i > lo and self._fileIds[i - 1] > fileId:
+            i -= 1
+
+        self._dates.insert(i, date)
+        self._values.insert(i, value)
+        self._fileIds.insert(i, fileId)
+
+    def _entries(self):
+        return zip(self._dates, self._values, self._fileIds)
+
+    def _copyEntries(self):
+        self._dates = self._dates[:]
+        self._values = self._values[:]
+        self._fileIds = self._fileIds[:]
+
+    def reload(self, timings=None):
+
+        # Reads files that were added or changed since they were last read and
+        # drops the entries of removed files. Only the new rows of files that
+        # were appended to are read. Entries of other files are kept without
+        # parsing them again, in the order a new map would have them. Nothing
+        # changes if a file cannot be read. Returns the names of the files that
+        # changed.
+
+        files = listFiles(self._path, self._requireDir)
+        present = set(files)
+
+        changed = [
+            filename for filename in files
+            if self._fileStats.get(filename) != fileStat(filename)
+        ]
+        removed = [
+            filename for filename in self._files if filename not in present
+        ]
+
+        if not changed and not removed:
+            return []
+
+        appended = [
+            filename for filename in changed
+            if filename in self._positions
+            and self._positions[filename].isPrefixOf(filename)
+        ]
+        rewritten = [
+            filename for filename in changed if filename not in appended
+        ]
+
+        # Parse everything before changing the map. Appended rows are read
+        # serially as there are usually few of them.
+
+        read = list(self._readFiles(rewritten, timings))
+
+        for filename in appended:
+
+            stat = fileStat(filename)
+            rows, position = self._readFile(
+                filename, None, self._positions[filename]
+            )
+
+            if timings is not None:
+                timings.fileRows(filename, len(rows))
+
+            read.append((filename, stat, rows, position))
+
+        if files == self._files and not rewritten and sum(
+            len(rows) for filename, stat, rows, position in read
+        ) <= RELOAD_INSERT_LIMIT:
+
+            # New lists and dictionaries are made so that a shallow copy of the
+            # map is not changed by reloading it
+            self._copyEntries()
+            self._fileStats = dict(self._fileStats)
+            self._positions = dict(self._positions)
+
+            for filename, stat, rows, position in read:
+
+                fileId = files.index(filename)
+
+                for date, value in rows:
+                    self._insertEntry(date, value, fileId)
+
+                self._fileStats[filename] = stat
+                self._positions[filename] = position
+
+            return sorted(changed)
+
+        dropped = set(rewritten + removed)
+        newIds = {filename: fileId for fileId, filename in enumerate(files)}
+        # None for the entries of dropped files
+        idMap = [
+            None if filename in dropped else newIds[filename]
+            for filename in self._files
+        ]
+
+        entries = [
+            (date, value, idMap[fileId])
+            for date, value, fileId in self._entries()
+            if idMap[fileId] is not None
+        ]
+
+        stats = dict(self._fileStats)
+        positions = dict(self._positions)
+
+        for filename, stat, rows, position in read:
+            fileId = newIds[filename]
+            entries.extend((date, value, fileId) for date, value in rows)
+            stats[filename] = stat
+            positions[filename] = position
+
+        for filename in removed:
+            del stats[filename]
+            del positions[filename]
+
+        # Rows on the same date are ordered by file as when loading, with
+        # appended rows after the earlier rows of their file
+        entries.sort(key=operator.itemgetter(0, 2))
+
+        self._files = files
+        self._fileStats = stats
+        self._positions = positions
+        self._setEntries(entries)
+
+        return sorted(changed + removed)
+
+    @classmethod
+    def stream(
+        cls, path, requireDir=True, parseCache=None, executor=None,
+        timings=None
+    ):
+
+        # Yields the (date, row) pairs of every file in file order, as they are
+        # parsed, without sorting or keeping them. Rows on the same date come
+        # in the same order as in a loaded map.
+
+        files = listFiles(path, requireDir)
+
+        if executor is None or len(files) < 2:
+
+            for filename in files:
+
+                if timings is None:
+                    yield from cls._readFile(filename, parseCache)[0]
+                    continue
+
+                rows = 0
+
+                for row in cls._readFile(filename, parseCache)[0]:
+                    rows += 1
+                    yield row
+
+                timings.fileRows(filename, rows)
+
+            return
+
+        # Only a few files are parsed ahead so that parsed rows do not build up
+        # when they are read more slowly than they are parsed
+
+        pending = collections.deque()
+
+        def parsed():
+
+            filename, future = pending.popleft()
+            rows, position = future.result()
+
+            if timings is not None:
+                timings.fileRows(filename, len(rows))
+
+            return rows
+
+        for filename in files:
+
+            pending.append(
+                (filename, executor.submit(readRows, cls, parseCache, filename))
+            )
+
+            if len(pending) > STREAM_FILES_AHEAD:
+                yield from parsed()
+
+        while pending:
+            yield from parsed()
 
 class IncomeTx():
 
+    __slots__ = ("asset", "amount", "note")
+
     def __init__(self, asset, amount, note):
-        self.asset = asset
+        # Asset names are interned so that rows share a single string
+        self.asset = sys.intern(asset)
         self.amount = Decimal(amount)
         self.note = note
 
+    @classmethod
+    def fromParsed(cls, asset, amount, note):
+        # Made from values that are already parsed, as when loaded from the
+        # parse cache
+        tx = cls.__new__(cls)
+        tx.asset = asset
+        tx.amount = amount
+        tx.note = note
+        return tx
+
 class CSVIncome(CSVDateMap):
 
-    def __init__(self, filename):
-        super().__init__(filename)
+    def __init__(self, filename, parseCache=None, executor=None, timings=None):
+        super().__init__(filename, True, parseCache, executor, timings)
 
-    def _processRow(self, row):
+    @staticmethod
+    def _processRow(row):
         return IncomeTx(row["ASSET"], row["AMOUNT"], row.get("NOTE"))
 
+    @staticmethod
+    def _valueColumns(values):
+        return (
+            assetIndexes(tx.asset for tx in values),
+            amountsText(tx.amount for tx in values),
+            [tx.note for tx in values]
+        )
+
+    @staticmethod
+    def _valuesOf(columns):
+        (names, indexes), amounts, notes = columns
+        return list(map(
+            IncomeTx.fromParsed, assetsOf(names, indexes), amountsOf(amounts),
+            notes
+        ))
+
 class GainTx():
 
+    __slots__ = ("sellAsset", "sellAmount", "buyAsset", "buyAmount")
+
     def __init__(self, sellAsset, buyAsset, sellAmount, buyAmount):
 
+        # Asset names are interned so that rows share a single string
+
         if not isEmpty(sellAsset):
-            self.sellAsset = sellAsset
+            self.sellAsset = sys.intern(sellAsset)
             self.sellAmount = Decimal(sellAmount)
         else:
             self.sellAsset = None
             self.sellAmount = None
 
         if not isEmpty(buyAsset):
-            self.buyAsset = buyAsset
+            self.buyAsset = sys.intern(buyAsset)
             self.buyAmount = Decimal(buyAmount)
         else:
             self.buyAsset = None
             self.buyAmount = None
 
+    @classmethod
+    def fromParsed(cls, sellAsset, sellAmount, buyAsset, buyAmount):
+        # Made from values that are already parsed, as when loaded from the
+        # parse cache
+        tx = cls.__new__(cls)
+        tx.sellAsset = sellAsset
+        tx.sellAmount = sellAmount
+        tx.buyAsset = buyAsset
+        tx.buyAmount = buyAmount
+        return tx
+
 class CSVGains(CSVDateMap):
 
-    def __init__(self, filename):
-        super().__init__(filename)
+    def __init__(self, filename, parseCache=None, executor=None, timings=None):
+        super().__init__(filename, True, parseCache, executor, timings)
 
-    def _processRow(self, row):
+    @staticmethod
+    def _processRow(row):
         return GainTx(
             row["SELL ASSET"], row["BUY ASSET"],
             row["SELL AMOUNT"], row["BUY AMOUNT"]
         )
 
+    @staticmethod
+    def _valueColumns(values):
+        return (
+            assetIndexes(tx.sellAsset for tx in values),
+            amountsText(tx.sellAmount for tx in values),
+            assetIndexes(tx.buyAsset for tx in values),
+            amountsText(tx.buyAmount for tx in values)
+        )
+
+    @staticmethod
+    def _valuesOf(columns):
+        sellAssets, sellAmounts, buyAssets, buyAmounts = columns
+        return list(map(
+            GainTx.fromParsed, assetsOf(*sellAssets), amountsOf(sellAmounts),
+            assetsOf(*buyAssets), amountsOf(buyAmounts)
+        ))
+
 class CSVPrices(CSVDateMap):
 
-    def __init__(self, filename, quoted):
-        super().__init__(filename, False)
+    # The prices of a single file. Times are held as an array of util.timeKey()
+    # keys and prices as a util.DecimalArray, so that long series such as
+    # minute prices stay compact. There is no list of dates or values.
+
+    def __init__(self, filename, quoted, parseCache=None):
+        super().__init__(filename, False, parseCache)
         self._quoted = quoted
 
-    def _processRow(self, row):
+    def _setEntries(self, entries):
+        self._dates = None
+        self._values = None
+        self._keys = timeKeysOf(date for date, value, fileId in entries)
+        self._prices = util.DecimalArray(
+            value for date, value, fileId in entries
+        )
+
+    def _insertEntry(self, date, value, fileId):
+        i = bisect.bisect_right(self._keys, util.timeKey(date))
+        self._keys.insert(i, util.timeKey(date))
+        self._prices.insert(i, value)
+
+    def _entries(self):
+        # Every entry is from the one file
+        return zip(datesOf(self._keys), self._prices, itertools.repeat(0))
+
+    def _copyEntries(self):
+        self._keys = self._keys[:]
+        self._prices = self._prices.copy()
+
+    @staticmethod
+    def _processRow(row):
         return Decimal(row["PRICE"])
 
+    @staticmethod
+    def _valueColumns(values):
+        return amountsText(values)
+
+    @staticmethod
+    def _valuesOf(columns):
+        return amountsOf(columns)
+
     def quotedAsset(self):
         return self._quoted
 
+    def __len__(self):
+        return len(self._keys)
+
+    def firstDate(self):
+        return util.dateOfKey(self._keys[0]) if len(self._keys) else None
+
+    def valueAt(self, key):
+
+        # The price at the latest time no later than the time key, or None if
+        # there is none
+
+        i = bisect.bisect_right(self._keys, key) - 1
+        return self._prices[i] if i >= 0 else None
+
+    def timeKeys(self):
+        return self._keys
+
+    def dates(self):
+        return datesOf(self._keys)
+
+    def values(self):
+        return self._prices
+
     def __getitem__(self, ind):
-        i = bisect.bisect(self._dates, ind) - 1
-        if i < 0:
+        value = self.valueAt(util.timeKey(ind))
+        if value is None:
             raise KeyError
-        return self._values[i]
+        return value
 
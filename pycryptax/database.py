@@ -0,0 +1,464 @@
+import datetime, sqlite3, threading
+from decimal import Decimal
+from pycryptax import csvdata, datemap, prices, columnar, util
+
+# Prices, gains and income imported from the CSV files of a working directory
+# into a SQLite database, so that later runs read only what they need through
+# indexes instead of parsing every file. Amounts are stored as text so that
+# they are read back as the same Decimals.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (kind TEXT PRIMARY KEY);
+
+CREATE TABLE IF NOT EXISTS assets (
+    asset TEXT PRIMARY KEY, quoted TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS prices (
+    asset TEXT NOT NULL, date TEXT NOT NULL, price TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pricesByAsset ON prices (asset, date);
+
+-- seq is the order in which the rows were read from the CSV files
+CREATE TABLE IF NOT EXISTS gains (
+    seq INTEGER PRIMARY KEY, date TEXT NOT NULL,
+    sellAsset TEXT, sellAmount TEXT, buyAsset TEXT, buyAmount TEXT
+);
+CREATE INDEX IF NOT EXISTS gainsBySellAsset ON gains (sellAsset, date);
+CREATE INDEX IF NOT EXISTS gainsByBuyAsset ON gains (buyAsset, date);
+
+CREATE TABLE IF NOT EXISTS income (
+    seq INTEGER PRIMARY KEY, date TEXT NOT NULL, asset TEXT NOT NULL,
+    amount TEXT NOT NULL, note TEXT
+);
+CREATE INDEX IF NOT EXISTS incomeByDate ON income (date, seq);
+CREATE INDEX IF NOT EXISTS incomeByAsset ON income (asset, date);
+"""
+
+# Each acquisition and disposal of the gains from a date with the asset and
+# amount used to value it. pos orders legs as they are read from the CSV files.
+LEGS = """
+WITH legs AS (
+    SELECT seq * 2 AS pos, date, buyAsset AS asset, 1 AS acquire,
+        buyAmount AS amount,
+        CASE WHEN sellAsset IS NULL THEN buyAsset ELSE sellAsset END
+            AS valAsset,
+        CASE WHEN sellAsset IS NULL THEN buyAmount ELSE sellAmount END
+            AS valAmount
+    FROM gains WHERE buyAsset IS NOT NULL AND buyAsset != :reportAsset
+        AND date >= :since
+    UNION ALL
+    SELECT seq * 2 + 1, date, sellAsset, 0, sellAmount,
+        CASE WHEN buyAsset IS NULL THEN sellAsset ELSE buyAsset END,
+        CASE WHEN buyAsset IS NULL THEN sellAmount ELSE buyAmount END
+    FROM gains WHERE sellAsset IS NOT NULL AND sellAsset != :reportAsset
+        AND date >= :since
+)
+"""
+
+class DataNotImported(FileNotFoundError):
+    pass
+
+def dateKey(date):
+    # A fixed width so that dates sort as text
+    return date.isoformat(" ", "microseconds")
+
+def dateOf(key):
+    return datetime.datetime.fromisoformat(key)
+
+class DayTotal():
+
+    # Totals the amounts and values of the legs of a day in the order they
+    # were read, as rows are given to aggregates in no particular order. The
+    # totals are returned as text.
+
+    def __init__(self):
+        self._legs = []
+
+    def step(self, pos, amount, valAmount, price):
+        self._legs.append((pos, amount, valAmount, price))
+
+    def finalize(self):
+
+        amountTotal = 0
+        valueTotal = 0
+
+        for pos, amount, valAmount, price in sorted(self._legs):
+            amountTotal += Decimal(amount)
+            valueTotal += Decimal(valAmount) * Decimal(price)
+
+        return "{} {}".format(amountTotal, valueTotal)
+
+class Database():
+
+    def __init__(self, path):
+        # The connection is shared by server threads, which use it in turn by
+        # holding the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript(SCHEMA)
+        self._conn.create_aggregate("dayTotal", 4, DayTotal)
+
+    def close(self):
+        self._conn.close()
+
+    def importDir(self, rootDir, parseCache=None, executor=None, timings=None):
+
+        # Replaces the data with that of the CSV files in the prices, gains and
+        # income directories of rootDir. Missing gains or income directories
+        # are recorded so that using the data raises DataNotImported. Returns
+        # {kind: rows imported}.
+
+        priceData = prices.Prices(
+            None, rootDir + "/prices", parseCache, executor, timings=timings
+        )
+
+        try:
+            # Streamed while inserting, so the directory is checked first
+            csvdata.listFiles(rootDir + "/gains", True)
+            gainData = csvdata.CSVGains.stream(
+                rootDir + "/gains", True, parseCache, executor, timings
+            )
+        except FileNotFoundError:
+            gainData = None
+
+        try:
+            incomeData = csvdata.CSVIncome(
+                rootDir + "/income", parseCache, executor, timings
+            )
+        except FileNotFoundError:
+            incomeData = None
+
+        counts = {"prices": 0, "gains": 0, "income": 0}
+
+        with self._conn:
+
+            for table in ("sources", "assets", "prices", "gains", "income"):
+                self._conn.execute("DELETE FROM " + table)
+
+            self._conn.execute("INSERT INTO sources VALUES ('prices')")
+
+            for asset, assetPrices in priceData.priceSeries():
+
+                self._conn.execute(
+                    "INSERT INTO assets VALUES (?, ?)",
+                    (asset, assetPrices.quotedAsset())
+                )
+                self._conn.executemany(
+                    "INSERT INTO prices VALUES (?, ?, ?)",
+                    (
+                        (asset, dateKey(date), str(price))
+                        for date, price in zip(
+                            assetPrices.dates(), assetPrices.values()
+                        )
+                    )
+                )
+
+                counts["prices"] += len(assetPrices)
+
+            if gainData is not None:
+
+                self._conn.execute("INSERT INTO sources VALUES ('gains')")
+
+                def gainRows():
+                    for date, tx in gainData:
+                        counts["gains"] += 1
+                        yield (
+                            counts["gains"], dateKey(date),
+                            tx.sellAsset, strOrNone(tx.sellAmount),
+                            tx.buyAsset, strOrNone(tx.buyAmount)
+                        )
+
+                self._conn.executemany(
+                    "INSERT INTO gains VALUES (?, ?, ?, ?, ?, ?)", gainRows()
+                )
+
+            if incomeData is not None:
+
+                self._conn.execute("INSERT INTO sources VALUES ('income')")
+                self._conn.executemany(
+                    "INSERT INTO income VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (seq, dateKey(date), tx.asset, str(tx.amount), tx.note)
+                        for seq, (date, tx) in enumerate(incomeData)
+                    )
+                )
+
+                counts["income"] = len(incomeData)
+
+        self._conn.execute("ANALYZE")
+
+        return counts
+
+    def _requireImported(self, kind):
+        if self._conn.execute(
+            "SELECT 1 FROM sources WHERE kind = ?", (kind,)
+        ).fetchone() is None:
+            raise DataNotImported(kind)
+
+    def priceData(self, reportAsset, memoSize=prices.DEFAULT_MEMO_SIZE,
+            useColumnar=False):
+        self._requireImported("prices")
+        return DatabasePrices(self, reportAsset, memoSize, useColumnar)
+
+    def gainData(self):
+        self._requireImported("gains")
+        return DatabaseGains(self._conn, self._lock)
+
+    def incomeData(self):
+        self._requireImported("income")
+        return DatabaseIncome(self._conn, self._lock)
+
+    def _assetPrices(self, asset, useColumnar):
+
+        # The prices of an asset, or None if there are none
+
+        with self._lock:
+
+            row = self._conn.execute(
+                "SELECT quoted FROM assets WHERE asset = ?", (asset,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            rows = self._conn.execute(
+                "SELECT date, price FROM prices WHERE asset = ? "
+                "ORDER BY date, rowid", (asset,)
+            ).fetchall()
+
+        dates = [dateOf(date) for date, price in rows]
+        values = [Decimal(price) for date, price in rows]
+
+        if useColumnar:
+            return columnar.ColumnarPrices(dates, values, row[0])
+
+        return StoredAssetPrices(dates, values, row[0])
+
+    def _pricesUpTo(self, limit):
+
+        # (asset, quoted, [(date, price)]) for every asset, with the prices up
+        # to the limit
+
+        with self._lock:
+
+            assets = self._conn.execute(
+                "SELECT asset, quoted FROM assets ORDER BY asset"
+            ).fetchall()
+
+            return [
+                (asset, quoted, self._conn.execute(
+                    "SELECT date, price FROM prices "
+                    "WHERE asset = ? AND date <= ? ORDER BY date, rowid",
+                    (asset, dateKey(limit))
+                ).fetchall())
+                for asset, quoted in assets
+            ]
+
+def strOrNone(amount):
+    return None if amount is None else str(amount)
+
+class StoredAssetPrices(datemap.DateMap):
+
+    def __init__(self, dates, values, quoted):
+        super().__init__()
+        self._dates = dates
+        self._values = values
+        self._quoted = quoted
+
+    def quotedAsset(self):
+        return self._quoted
+
+class StoredPrices():
+
+    # The prices of each asset, read from the database when first used
+
+    def __init__(self, db, useColumnar):
+        self._db = db
+        self._useColumnar = useColumnar
+        self._loaded = {}
+
+    def _get(self, asset):
+
+        try:
+            return self._loaded[asset]
+        except KeyError:
+            assetPrices = self._loaded[asset] = \
+                self._db._assetPrices(asset, self._useColumnar)
+            return assetPrices
+
+    def __contains__(self, asset):
+        return self._get(asset) is not None
+
+    def __getitem__(self, asset):
+
+        assetPrices = self._get(asset)
+
+        if assetPrices is None:
+            raise KeyError(asset)
+
+        return assetPrices
+
+    def items(self):
+        return [
+            (asset, assetPrices) for asset, assetPrices in self._loaded.items()
+            if assetPrices is not None
+        ]
+
+class DatabasePrices(prices.Prices):
+
+    # Prices as given by prices.Prices, with the prices of each asset read from
+    # the database when first used
+
+    def __init__(self, db, reportAsset, memoSize=prices.DEFAULT_MEMO_SIZE,
+            useColumnar=False):
+        super().__init__(
+            reportAsset, None, memoSize=memoSize, useColumnar=useColumnar
+        )
+        self._d = StoredPrices(db, useColumnar)
+        self._db = db
+
+    def _scan(self):
+        return {}
+
+    def pricesUpTo(self, limit):
+        # As prices.Prices.pricesUpTo(), without reading every asset
+        for asset, quoted, rows in self._db._pricesUpTo(limit):
+            yield (
+                asset, quoted,
+                [util.timeKey(dateOf(date)) for date, price in rows],
+                [Decimal(price) for date, price in rows]
+            )
+
+    def reload(self, timings=None):
+        # The database changes only when imported again
+        return set()
+
+class DatabaseGains():
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def dayTotals(self, reportAsset, priceData, phase, since=None):
+
+        # Yields (asset, day, acquire, first, legs, amount, value) for the
+        # acquisitions or disposals of each asset on each day, totalled in the
+        # database. first is the position of the first leg of the day, by
+        # which assets are ordered. Gains before since are left out.
+        # phase(name) times the work.
+
+        params = {
+            "reportAsset": reportAsset,
+            "since": "" if since is None else dateKey(since)
+        }
+
+        with phase("value gains"):
+
+            # Each valuation is priced once
+
+            # The lock is not held while pricing, as prices may be read from
+            # the database
+
+            with self._lock:
+                pairs = self._conn.execute(
+                    LEGS + "SELECT DISTINCT valAsset, date FROM legs", params
+                ).fetchall()
+
+            try:
+                values = priceData.priceMany(
+                    (asset, dateOf(date)) for asset, date in pairs
+                )
+            except (prices.AssetPricesNotFound, prices.PriceNotFoundForDate):
+                # Report the first missing price as when reading the CSV files
+                with self._lock:
+                    ordered = self._conn.execute(
+                        LEGS + "SELECT valAsset, date FROM legs ORDER BY pos",
+                        params
+                    ).fetchall()
+                priceData.priceMany(
+                    (asset, dateOf(date)) for asset, date in ordered
+                )
+                raise
+
+        # The temporary table is shared by every user of the connection, so it
+        # is filled and used under the lock
+        with self._lock:
+
+            with phase("value gains"):
+                self._conn.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS legPrices "
+                    "(asset TEXT, date TEXT, price TEXT, "
+                    "PRIMARY KEY (asset, date))"
+                )
+                self._conn.execute("DELETE FROM legPrices")
+                self._conn.executemany(
+                    "INSERT INTO legPrices VALUES (?, ?, ?)",
+                    (
+                        (asset, date, str(price))
+                        for (asset, date), price in zip(pairs, values)
+                    )
+                )
+
+            with phase("total gain days"):
+                # Legs are valued at their times and totalled by calendar day,
+                # the first ten characters of a date
+                rows = self._conn.execute(
+                    LEGS + "SELECT legs.asset, substr(legs.date, 1, 10) AS day, "
+                    "acquire, MIN(pos), COUNT(*), "
+                    "dayTotal(pos, amount, valAmount, price) "
+                    "FROM legs JOIN legPrices "
+                    "ON legPrices.asset = legs.valAsset "
+                    "AND legPrices.date = legs.date "
+                    "GROUP BY legs.asset, day, acquire", params
+                ).fetchall()
+
+        for asset, day, acquire, first, legs, totals in rows:
+            amount, value = totals.split(" ")
+            yield (
+                asset, dateOf(day), bool(acquire), first, legs,
+                Decimal(amount), Decimal(value)
+            )
+
+    def rowsUpTo(self, limit):
+
+        # Yields (date, GainTx) for the gains up to the limit in no particular
+        # order
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, sellAsset, sellAmount, buyAsset, buyAmount "
+                "FROM gains WHERE date <= ?", (dateKey(limit),)
+            ).fetchall()
+
+        for date, sellAsset, sellAmount, buyAsset, buyAmount in rows:
+            yield dateOf(date), csvdata.GainTx(
+                sellAsset, buyAsset, sellAmount, buyAmount
+            )
+
+    def reload(self, timings=None):
+        return []
+
+class DatabaseIncome():
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def range(self, start, end):
+
+        # Yields (date, IncomeTx) from start to end inclusive, in the order of
+        # a CSVIncome
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, asset, amount, note FROM income "
+                "WHERE date >= ? AND date <= ? ORDER BY date, seq",
+                (dateKey(start), dateKey(end))
+            ).fetchall()
+
+        for date, asset, amount, note in rows:
+            yield dateOf(date), csvdata.IncomeTx(asset, amount, note)
+
+    def reload(self, timings=None):
+        return []
@@ -1,4 +1,4 @@
-import bisect, datetime
+import bisect, datetime, operator
 
 class DateMapIterator():
 
@@ -62,6 +62,12 @@ class DateMap():
 
         return self._dates[ind], self._values[ind]
 
+    def dates(self):
+        return self._dates
+
+    def values(self):
+        return self._values
+
     def __len__(self):
         return len(self._dates)
 
@@ -76,3 +82,15 @@ class DateMap():
 
         return value
 
+    def extend(self, items):
+
+        # Add many (date, value) pairs with a single stable sort rather than
+        # inserting one at a time. Existing entries come first so that equal
+        # dates keep the same order as repeated calls to insert() would give.
+
+        items = list(zip(self._dates, self._values)) + list(items)
+        items.sort(key=operator.itemgetter(0))
+
+        self._dates = [date for date, value in items]
+        self._values = [value for date, value in items]
+
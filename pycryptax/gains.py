@@ -1,12 +1,17 @@
-import copy, datetime
+import collections, contextlib, datetime, functools, itertools
 from decimal import Decimal
-from pycryptax import util, output, datemap
+from pycryptax import util, output, datemap, checkpoint, database
+
+# The number of acquisitions and disposals valued together when reading gains
+VALUATION_BATCH_SIZE = 4096
 
 class AssetPool():
 
-    def __init__(self):
-        self.totalQuantity = 0
-        self.totalCost = 0
+    __slots__ = ("totalQuantity", "totalCost")
+
+    def __init__(self, quantity=0, cost=0):
+        self.totalQuantity = quantity
+        self.totalCost = cost
 
     def add(self, quantity, cost):
         self.totalQuantity += quantity
@@ -26,11 +31,21 @@ class AssetPool():
 
         return cost
 
+    def snapshot(self):
+        return PoolSnapshot(self.totalQuantity, self.totalCost)
+
     def __repr__(self):
         return "AssetPool({}, {})".format(self.totalQuantity, self.totalCost)
 
+# An unchanging record of a section 104 holding at a point in time
+PoolSnapshot = collections.namedtuple(
+    "PoolSnapshot", ("totalQuantity", "totalCost")
+)
+
 class AggregateDayTxs():
 
+    __slots__ = ("acquireAmt", "acquireVal", "disposeAmt", "disposeVal")
+
     def __init__(self):
 
         self.acquireAmt = 0
@@ -49,6 +64,8 @@ class AggregateDayTxs():
 
 class Gain():
 
+    __slots__ = ("_value", "_cost")
+
     def __init__(self, cost=0, value=0):
         self._value = value
         self._cost = cost
@@ -67,25 +84,247 @@ class Gain():
     def gain(self):
         return self._value - self._cost
 
+class GainPeriod():
+
+    # The gains, disposals and section 104 holdings for one calculation period
+
+    def __init__(self, start, end, summary, disposals):
+
+        self.start = start
+        self.end = end
+
+        if summary:
+            self.assetGain = {}
+            self.totalGain = Gain()
+
+        if disposals:
+            self.disposals = datemap.DateMap()
+
+        self.assetPoolsAtEnd = {}
+
+class AssetMatch():
+
+    # The result of matching the disposals of one asset. Gains are kept in the
+    # order they were realised so that results can be merged in a fixed order.
+
+    def __init__(self, asset):
+        self.asset = asset
+        # [(date, Gain)]
+        self.gains = []
+        # A PoolSnapshot or None for each boundary date
+        self.holdings = []
+        # Amounts of acquisitions after the checkpoint date matched to
+        # disposals on or before it, as [(asset, date, amount, cost)]
+        self.consumed = []
+        # The section 104 holding after the last day, if any
+        self.pool = None
+        # Counts for --timings
+        self.sameDayMatches = 0
+        self.bedAndBreakfastMatches = 0
+        self.poolDisposals = 0
+        self.snapshots = 0
+
+def matchAsset(
+    asset, dayTxs, consumed, pool, boundaryDates, resumeFrom=None,
+    checkpointDate=None
+):
+
+    # Applies the same-day, bed and breakfasting and section 104 rules to the
+    # days of one asset.
+    #
+    # consumed and pool are the entries for this asset from a checkpoint being
+    # resumed from. The holding is recorded at the end of each boundary date,
+    # which must be sorted.
+
+    result = AssetMatch(asset)
+
+    def match(date, disposeTx, acquireTx):
+
+        # Get amount that can be matched
+        amount = min(disposeTx.disposeAmt, acquireTx.acquireAmt)
+
+        if amount == 0:
+            # Cannot match nothing
+            return 0, 0
+
+        # Get proportion of cost
+        cost = acquireTx.acquireVal * amount / acquireTx.acquireAmt
+
+        # Get proportion of disposal value
+        value = disposeTx.disposeVal * amount / disposeTx.disposeAmt
+
+        # Apply gain/loss
+        result.gains.append((date, Gain(cost, value)))
+
+        # Adjust data to remove amounts and report asset values that have
+        # been accounted for
+
+        disposeTx.disposeAmt -= amount
+        acquireTx.acquireAmt -= amount
+
+        disposeTx.disposeVal -= value
+        acquireTx.acquireVal -= cost
+
+        return amount, cost
+
+    # Days already accounted for by a checkpoint are skipped
+    days = dayTxs if resumeFrom is None else dayTxs.range(resumeFrom, None)
+
+    # Same-day rule: Match disposals to acquisitions that happen on the same day
+
+    for date, tx in days:
+        if match(date, tx, tx)[0] != 0:
+            result.sameDayMatches += 1
+
+    # Remove amounts matched to disposals before the checkpoint, which come
+    # before later disposals in the order of matching
+
+    for cAsset, date, amount, cost in consumed:
+
+        tx = dayTxs[date]
+        tx.acquireAmt -= amount
+        tx.acquireVal -= cost
+
+        if checkpointDate is not None and date > checkpointDate:
+            result.consumed.append((asset, date, amount, cost))
+
+    if pool is not None:
+        result.pool = AssetPool(*pool)
+
+    # Bed and breakfasting rule
+    # Match disposals to nearest acquisitions from 1->30 days afterwards
+
+    # Both the disposals and their 30 day windows only move forwards, so the
+    # acquisitions are swept once. Acquisitions that are before the current
+    # disposal or used up are skipped from the front of the window and never
+    # visited again.
+
+    acquisitions = [(date, tx) for date, tx in days if tx.acquireAmt != 0]
+    first = 0
+
+    for date, tx in days:
+
+        # Only process disposals
+        if tx.disposeAmt == 0:
+            continue
+
+        while first < len(acquisitions) and (
+            acquisitions[first][0] <= date
+            or acquisitions[first][1].acquireAmt == 0
+        ):
+            first += 1
+
+        windowEnd = date + datetime.timedelta(days=30)
+        i = first
+
+        # Loop though acquisitions in range until the disposal is matched
+        while i < len(acquisitions) and tx.disposeAmt != 0:
+
+            matchDate, matchTx = acquisitions[i]
+
+            if matchDate > windowEnd:
+                break
+
+            amount, cost = match(date, tx, matchTx)
+
+            if amount != 0:
+                result.bedAndBreakfastMatches += 1
+
+            if checkpointDate is not None and amount != 0 \
+                    and date <= checkpointDate < matchDate:
+                result.consumed.append((asset, matchDate, amount, cost))
+
+            i += 1
+
+    # Process section 104 holdings from very beginning but only count gains
+    # realised within each period.
+
+    # The holding is recorded as it is at the end of each boundary date when
+    # the first day after it is reached
+
+    def recordHolding():
+
+        # None until the asset has a holding
+
+        if result.pool is None:
+            result.holdings.append(None)
+        else:
+            result.holdings.append(result.pool.snapshot())
+            result.snapshots += 1
+
+    for date, tx in days:
+
+        while len(result.holdings) < len(boundaryDates) \
+                and boundaryDates[len(result.holdings)] < date:
+            recordHolding()
+
+        # Only an acquisation or disposal, not both allowed.
+        # Should have been previously matched
+        assert(not (tx.acquireAmt != 0 and tx.disposeAmt != 0))
+
+        if tx.acquireAmt != 0:
+
+            # Adjust section 104 holding
+
+            if result.pool is None:
+                result.pool = AssetPool()
+
+            result.pool.add(tx.acquireAmt, tx.acquireVal)
+
+        if tx.disposeAmt != 0:
+
+            if result.pool is None:
+                raise ValueError("Disposing of an asset not acquired")
+
+            # Adjust section 104 holding and get cost
+            try:
+                cost = result.pool.dispose(tx.disposeAmt)
+            except ValueError as e:
+                print(util.getPrettyDate(date) + " (" + asset + "): " + str(e))
+                raise e
+
+            # Apply gain/loss
+            result.gains.append((date, Gain(cost, tx.disposeVal)))
+            result.poolDisposals += 1
+
+    # Boundaries after the last day have the final holding
+
+    while len(result.holdings) < len(boundaryDates):
+        recordHolding()
+
+    return result
+
 class CapitalGainCalculator():
 
     def __init__(
-        self, gainData, priceData, start, end, summary=True, disposals=False
+        self, gainData, priceData, start, end, summary=True, disposals=False,
+        extraPeriods=(), resume=None, checkpointDate=None, timings=None
     ):
 
-        self._start = start
-        self._end = end
-        self._includeSummary = summary
-        self._includeDisposals = disposals
+        # History is replayed once for all periods. Additional periods are
+        # given as (start, end) tuples. Periods and the checkpoint date are
+        # whole days, as trades are matched by the day they fall on.
+        #
+        # If resume is a checkpoint.Checkpoint, only trades after it are valued
+        # and matched, starting from its section 104 holdings. If
+        # checkpointDate is given, the state at the end of that date is kept
+        # and returned by checkpoint(). If timings is given, the time and work
+        # done in each phase is added to it.
+
+        self._periods = [
+            GainPeriod(
+                util.dayOf(periodStart), util.dayOf(periodEnd), summary,
+                disposals
+            )
+            for periodStart, periodEnd in [(start, end)] + list(extraPeriods)
+        ]
 
-        if summary:
-            self._assetGain = {}
-            self._totalGain = Gain()
+        if checkpointDate is not None:
+            checkpointDate = util.dayOf(checkpointDate)
 
-        if disposals:
-            self._disposals = datemap.DateMap()
+        self._includeSummary = summary
+        self._includeDisposals = disposals
 
-        self._assetPoolsAtEnd = {}
         self._assetPools = {}
 
         self._priceData = priceData
@@ -95,176 +334,323 @@ class CapitalGainCalculator():
         def isNonReportAsset(asset):
             return asset and asset != reportAsset
 
+        def phase(name):
+            if timings is None:
+                return contextlib.nullcontext()
+            return timings.phase(name)
+
         # Obtain total acquisition and disposal values for each day for every
-        # asset
+        # asset. Each trade is valued at its own time but is totalled into the
+        # calendar day it falls on, by which the same day and bed and breakfast
+        # rules match. Trades are folded into the days as they are read, so
+        # gainData can be a stream of (date, GainTx) in any order and only the
+        # days are kept. gainData can also be a database.DatabaseGains, which
+        # totals the days itself.
 
-        assetTxs = {}
+        # A checkpoint being resumed from holds the state at the end of its
+        # date, so earlier gains are only read to check that they have not
+        # changed since it was saved
+
+        # (limit, checkpoint.GainsDigest) of the gains up to the limit of the
+        # checkpoint being resumed from and the one being saved
+
+        digests = []
+        resumeFrom = None
 
-        def getDayTxForAsset(asset, date):
+        if resume is not None:
+            resumeFrom = resume.date + datetime.timedelta(days=1)
+            resumeDigest = checkpoint.GainsDigest()
+            digests.append((checkpoint.limitOf(resume.date), resumeDigest))
 
-            if asset not in assetTxs:
-                assetTxs[asset] = datemap.DateMap()
+        if checkpointDate is not None:
+            saveDigest = checkpoint.GainsDigest()
+            digests.append((checkpoint.limitOf(checkpointDate), saveDigest))
 
-            dayTxs = assetTxs[asset]
+        def addToDigests(date, tx):
+            for limit, digest in digests:
+                if date <= limit:
+                    digest.add(date, tx)
 
-            if date not in dayTxs:
-                return dayTxs.insert(date, AggregateDayTxs())
+        def checkedRows(gainData):
+            for date, tx in gainData:
+                addToDigests(date, tx)
+                if resumeFrom is None or date >= resumeFrom:
+                    yield date, tx
 
-            return dayTxs[date]
+        assetDays = {}
 
-        def getValueOfAssetAmount(asset, amount, otherAsset, otherAmount, date):
+        # Assets are ordered by their first trade, as if the trades had been
+        # sorted by date. This is the earliest (day, position) of each asset.
+        firstTrade = {}
+
+        def valuationOf(asset, amount, otherAsset, otherAmount, date):
 
             if otherAsset:
                 # Use the value of the other asset in exchange according to CG78310
-                return otherAmount * priceData.get(otherAsset, date)
+                return otherAsset, otherAmount, date
             else:
                 # Use market value
-                return amount * priceData.get(asset, date)
+                return asset, amount, date
 
-        for date, tx in gainData:
+        def legsOf(gainData):
 
-            if isNonReportAsset(tx.buyAsset):
-                # Acquisition
+            for date, tx in gainData:
 
-                getDayTxForAsset(tx.buyAsset, date).acquire(
-                    tx.buyAmount,
-                    getValueOfAssetAmount(
-                        tx.buyAsset, tx.buyAmount, tx.sellAsset,
-                        tx.sellAmount, date
+                if isNonReportAsset(tx.buyAsset):
+                    # Acquisition
+                    yield (
+                        AggregateDayTxs.acquire, tx.buyAsset, tx.buyAmount, date,
+                        valuationOf(
+                            tx.buyAsset, tx.buyAmount, tx.sellAsset,
+                            tx.sellAmount, date
+                        )
                     )
-                )
-
-            if isNonReportAsset(tx.sellAsset):
-                # Disposal
 
-                getDayTxForAsset(tx.sellAsset, date).dispose(
-                    tx.sellAmount,
-                    getValueOfAssetAmount(
-                        tx.sellAsset, tx.sellAmount, tx.buyAsset,
-                        tx.buyAmount, date
+                if isNonReportAsset(tx.sellAsset):
+                    # Disposal
+                    yield (
+                        AggregateDayTxs.dispose, tx.sellAsset, tx.sellAmount,
+                        date, valuationOf(
+                            tx.sellAsset, tx.sellAmount, tx.buyAsset,
+                            tx.buyAmount, date
+                        )
                     )
-                )
 
-        def applyGain(asset, gain, date):
+        if isinstance(gainData, database.DatabaseGains):
 
-            if date < start or date > end:
-                return
+            # The days are totalled by the database
 
-            if self._includeSummary:
-                self._totalGain += gain
-                util.addToDictKey(self._assetGain, asset, gain)
+            if digests:
+                for date, tx in gainData.rowsUpTo(
+                    max(limit for limit, digest in digests)
+                ):
+                    addToDigests(date, tx)
 
-            if self._includeDisposals:
-                self._disposals.insert(date, (asset, gain))
+            position = 0
 
-        def match(asset, date, disposeTx, acquireTx):
+            for asset, day, acquire, first, legs, amount, value in \
+                    gainData.dayTotals(reportAsset, priceData, phase, resumeFrom):
 
-            # Get amount that can be matched
-            amount = min(disposeTx.disposeAmt, acquireTx.acquireAmt)
+                if asset not in assetDays:
+                    assetDays[asset] = {}
+                    firstTrade[asset] = (day, first)
+                else:
+                    firstTrade[asset] = min(firstTrade[asset], (day, first))
 
-            if amount == 0:
-                # Cannot match nothing
-                return
+                days = assetDays[asset]
 
-            # Get proportion of cost
-            cost = acquireTx.acquireVal * amount / acquireTx.acquireAmt
+                if day not in days:
+                    days[day] = AggregateDayTxs()
 
-            # Get proportion of disposal value
-            value = disposeTx.disposeVal * amount / disposeTx.disposeAmt
+                if acquire:
+                    days[day].acquire(amount, value)
+                else:
+                    days[day].dispose(amount, value)
 
-            # Apply gain/loss
-            applyGain(asset, Gain(cost, value), date)
+                position += legs
 
-            # Adjust data to remove amounts and report asset values that have
-            # been accounted for
+        else:
 
-            disposeTx.disposeAmt -= amount
-            acquireTx.acquireAmt -= amount
+            # Acquisitions and disposals are valued in batches, which is fast
+            # when the gains are in date order
 
-            disposeTx.disposeVal -= value
-            acquireTx.acquireVal -= cost
+            legs = legsOf(checkedRows(gainData) if digests else gainData)
+            position = 0
 
-        for asset, dayTxs in assetTxs.items():
+            while True:
 
-            # Same-day rule: Match disposals to acquisitions that happen on the same day
+                batch = list(itertools.islice(legs, VALUATION_BATCH_SIZE))
 
-            for date, tx in dayTxs:
-                match(asset, date, tx, tx)
+                if not batch:
+                    break
 
-            # Bed and breakfasting rule
-            # Match disposals to nearest acquisitions from 1->30 days afterwards
+                with phase("value gains"):
+                    values = priceData.valueMany(leg[4] for leg in batch)
 
-            for date, tx in dayTxs:
+                for (apply, asset, amount, date, valuation), value in zip(
+                    batch, values
+                ):
 
-                # Only process disposals
-                if tx.disposeAmt == 0:
-                    continue
+                    day = util.dayOf(date)
 
-                # Loop though tranactions in range to match against
-                for matchDate, matchTx in dayTxs.range(
-                    date + datetime.timedelta(days=1),
-                    date + datetime.timedelta(days=30)
-                ):
-                    match(asset, date, tx, matchTx)
+                    if asset not in assetDays:
+                        assetDays[asset] = {}
+                        firstTrade[asset] = (day, position)
+                    elif day < firstTrade[asset][0]:
+                        firstTrade[asset] = (day, position)
+
+                    days = assetDays[asset]
+
+                    if day not in days:
+                        days[day] = AggregateDayTxs()
+
+                    apply(days[day], amount, value)
+                    position += 1
 
-            # Process section 104 holdings from very beginning but only count gains
-            # realised between start and end.
+        # The assets of a checkpoint were first traded before any others, and
+        # may have no later trades
 
-            for date, tx in dayTxs:
+        assetTxs = {}
+        earlier = [] if resume is None else resume.assets
+
+        for asset in earlier + sorted(
+            set(assetDays).difference(earlier), key=firstTrade.get
+        ):
+            assetTxs[asset] = datemap.DateMap()
+            assetTxs[asset].extend(assetDays.pop(asset, {}).items())
+
+        if timings is not None:
+            timings.count("gain acquisitions and disposals", position)
+            timings.count("gain assets", len(assetTxs))
+            timings.count(
+                "gain asset days", sum(len(days) for days in assetTxs.values())
+            )
 
-                # Only an acquisation or disposal, not both allowed.
-                # Should have been previously matched
-                assert(not (tx.acquireAmt != 0 and tx.disposeAmt != 0))
+        if resume is not None:
 
-                if tx.acquireAmt != 0:
+            with phase("check checkpoint"):
+                resume.verify(reportAsset, checkpoint.digestOf(
+                    reportAsset, resumeDigest, priceData,
+                    checkpoint.limitOf(resume.date)
+                ))
 
-                    # Adjust section 104 holding
+            for period in self._periods:
+                if period.start <= resume.date:
+                    raise checkpoint.CheckpointTooLate(resume.date)
 
-                    if asset not in self._assetPools:
-                        self._assetPools[asset] = AssetPool()
+            if checkpointDate is not None and checkpointDate < resume.date:
+                raise checkpoint.CheckpointTooLate(resume.date)
 
-                    self._assetPools[asset].add(tx.acquireAmt, tx.acquireVal)
+        self._checkpoint = None
 
-                if tx.disposeAmt != 0:
+        if checkpointDate is not None:
+            savePools = {}
+            saveConsumed = []
 
-                    if asset not in self._assetPools:
-                        raise ValueError("Disposing of an asset not acquired")
+            with phase("check checkpoint"):
+                digest = checkpoint.digestOf(
+                    reportAsset, saveDigest, priceData,
+                    checkpoint.limitOf(checkpointDate)
+                )
 
-                    # Adjust section 104 holding and get cost
-                    try:
-                        cost = self._assetPools[asset].dispose(tx.disposeAmt)
-                    except ValueError as e:
-                        print(util.getPrettyDate(date) + " (" + asset + "): " + str(e))
-                        raise e
+            self._checkpoint = checkpoint.Checkpoint(
+                checkpointDate, reportAsset, digest, [
+                    asset for asset in assetTxs
+                    if asset in earlier or firstTrade[asset][0] <= checkpointDate
+                ],
+                savePools, saveConsumed
+            )
 
-                    # Apply gain/loss
-                    applyGain(asset, Gain(cost, tx.disposeVal), date)
+        # Each asset is matched on its own, as nothing is shared between
+        # assets until the gains are added up. The results are merged in the
+        # order of assetTxs.
 
-                if date <= end:
-                    # Update asset pools up until the end of the range to get the
-                    # section 104 holdings at the point of the end of the range
-                    self._assetPoolsAtEnd[asset] = copy.deepcopy(self._assetPools[asset])
+        boundaries = [
+            (period.end, period.assetPoolsAtEnd) for period in self._periods
+        ]
 
-    def printSummary(self):
+        if checkpointDate is not None:
+            boundaries.append((checkpointDate, savePools))
 
-        output.printCalculationTitle("CAPITAL GAIN", self._start, self._end)
+        boundaries.sort(key=lambda b: b[0])
+
+        match = functools.partial(
+            matchAsset, boundaryDates=[date for date, snapshots in boundaries],
+            resumeFrom=resumeFrom, checkpointDate=checkpointDate
+        )
+
+        assets = list(assetTxs)
+        dayTxsList = [assetTxs[asset] for asset in assets]
+
+        if resume is None:
+            consumedList = [()] * len(assets)
+            poolList = [None] * len(assets)
+        else:
+            consumedList = [
+                [c for c in resume.consumed if c[0] == asset] for asset in assets
+            ]
+            poolList = [resume.pools.get(asset) for asset in assets]
+
+        with phase("match gains"):
+            self._mergeMatches(
+                match, assets, dayTxsList, consumedList, poolList, boundaries,
+                timings, saveConsumed if checkpointDate is not None else None
+            )
+
+    def _mergeMatches(
+        self, match, assets, dayTxsList, consumedList, poolList, boundaries,
+        timings, saveConsumed
+    ):
+
+        for result in map(match, assets, dayTxsList, consumedList, poolList):
+
+            for date, gain in result.gains:
+                self._applyGain(result.asset, gain, date)
+
+            for (date, snapshots), snapshot in zip(boundaries, result.holdings):
+                if snapshot is not None:
+                    snapshots[result.asset] = snapshot
+
+            if result.pool is not None:
+                self._assetPools[result.asset] = result.pool
+
+            if saveConsumed is not None:
+                saveConsumed.extend(result.consumed)
+
+            if timings is not None:
+                timings.count("same day matches", result.sameDayMatches)
+                timings.count(
+                    "bed and breakfast matches", result.bedAndBreakfastMatches
+                )
+                timings.count("section 104 disposals", result.poolDisposals)
+                timings.count("section 104 snapshots", result.snapshots)
+
+    def _applyGain(self, asset, gain, date):
+
+        for period in self._periods:
+
+            if date < period.start or date > period.end:
+                continue
+
+            if self._includeSummary:
+                period.totalGain += gain
+                util.addToDictKey(period.assetGain, asset, gain)
+
+            if self._includeDisposals:
+                period.disposals.insert(date, (asset, gain))
+
+    def checkpoint(self):
+        return self._checkpoint
+
+    def printSummary(self, file=None):
+        for period in self._periods:
+            self._printPeriodSummary(period, file)
+
+    def _printPeriodSummary(self, period, file):
+
+        output.printCalculationTitle(
+            "CAPITAL GAIN", period.start, period.end, file
+        )
 
         table = output.OutputTable(4)
         table.appendRow("ASSET", "ACQUISITION COST", "DISPOSAL VALUE", "GAIN / LOSS")
         table.appendGap()
 
-        for k, v in self._assetGain.items():
+        for k, v in period.assetGain.items():
             table.appendRow(k, v.cost(), v.value(), v.gain())
 
         table.appendGap()
         table.appendRow(
-            "TOTAL", self._totalGain.cost(), self._totalGain.value(),
-            self._totalGain.gain()
+            "TOTAL", period.totalGain.cost(), period.totalGain.value(),
+            period.totalGain.gain()
         )
 
-        table.print()
+        table.print(file)
 
-        print("SECTION 104 HOLDINGS AS OF {}:\n".format(util.getPrettyDate(self._end)))
+        print(
+            "SECTION 104 HOLDINGS AS OF {}:\n"
+            .format(util.getPrettyDate(period.end)), file=file
+        )
 
         table = output.OutputTable(5)
         table.appendRow("ASSET", "AMOUNT", "COST", "VALUE", "UNREALISED GAIN")
@@ -273,9 +659,10 @@ class CapitalGainCalculator():
         totalCost = Decimal(0)
         totalValue = Decimal(0)
 
-        for asset, pool in self._assetPoolsAtEnd.items():
+        for asset, pool in period.assetPoolsAtEnd.items():
 
-            value = pool.totalQuantity * self._priceData.get(asset, self._end)
+            value = pool.totalQuantity \
+                * self._priceData.get(asset, util.endOfDay(period.end))
 
             totalCost += pool.totalCost
             totalValue += value
@@ -287,21 +674,32 @@ class CapitalGainCalculator():
         table.appendGap()
         table.appendRow("", "TOTAL", totalCost, totalValue, totalValue - totalCost)
 
-        table.print()
-
-    def printDisposals(self):
+        table.print(file)
 
-        print("Date,Asset,Cost,Proceeds,Gain")
+    def printDisposals(self, file=None):
 
         def numFormat(n):
             return "{:.2f}".format(n)
 
-        for date, (asset, gain) in self._disposals:
-            print("{},\"{}\",{},{},{}".format(
-                util.getPrettyDate(date),
-                asset.replace('"', '""'),
-                numFormat(gain.cost()),
-                numFormat(gain.value()),
-                numFormat(gain.gain()),
-            ))
+        writer = output.csvWriter(file)
+
+        for i, period in enumerate(self._periods):
+
+            # Each period is output as a separate CSV table
+            if i > 0:
+                writer.writerow(())
 
+            writer.writerow(("Date", "Asset", "Cost", "Proceeds", "Gain"))
+
+            writer.writerows(
+                (
+                    util.getPrettyDate(date),
+                    asset,
+                    numFormat(gain.cost()),
+                    numFormat(gain.value()),
+                    numFormat(gain.gain()),
+                )
+                for date, (asset, gain) in zip(
+                    period.disposals.dates(), period.disposals.values()
+                )
+            )
@@ -1,15 +1,20 @@
+import contextlib
 from decimal import Decimal
 from pycryptax import util, output
 
+ZERO = Decimal(0)
+
 class IncomeValue():
 
-    def __init__(self, value=Decimal(0)):
+    __slots__ = ("_in", "_out")
+
+    def __init__(self, value=ZERO):
         if value > 0:
             self._in = value
-            self._out = Decimal(0)
+            self._out = ZERO
         else:
             self._out = -value
-            self._in = Decimal(0)
+            self._in = ZERO
 
     def __iadd__(self, amount):
         self._in += amount._in
@@ -27,6 +32,8 @@ class IncomeValue():
 
 class IncomeTx():
 
+    __slots__ = ("asset", "date", "amount", "price", "incomeValue", "note")
+
     def __init__(self, asset, date, amount, price, incomeValue, note):
         self.asset = asset
         self.date = date
@@ -37,17 +44,29 @@ class IncomeTx():
 
 class IncomeCalculator():
 
-    def __init__(self, incomeData, priceData, start, end):
+    def __init__(self, incomeData, priceData, start, end, timings=None):
 
-        self._start = start
-        self._end = end
+        # The period covers whole days, including all of the end day
+        self._start = util.dayOf(start)
+        self._end = util.dayOf(end)
 
         self._assetIncome = {}
         self._txs = []
         self._total = IncomeValue()
 
-        for date, tx in incomeData.range(start, end):
-            price = priceData.get(tx.asset, date)
+        txs = list(incomeData.range(self._start, util.endOfDay(self._end)))
+
+        # Look up all prices together, which is fast as they are in date order
+        phase = contextlib.nullcontext() if timings is None \
+            else timings.phase("value income")
+
+        with phase:
+            prices = priceData.priceMany((tx.asset, date) for date, tx in txs)
+
+        if timings is not None:
+            timings.count("income transactions", len(txs))
+
+        for (date, tx), price in zip(txs, prices):
             incomeValue = IncomeValue(tx.amount * price)
             self._txs.append(
                 IncomeTx(
@@ -57,9 +76,9 @@ class IncomeCalculator():
             self._total += incomeValue
             util.addToDictKey(self._assetIncome, tx.asset, incomeValue)
 
-    def printSummary(self):
+    def printSummary(self, file=None):
 
-        output.printCalculationTitle("INCOME", self._start, self._end)
+        output.printCalculationTitle("INCOME", self._start, self._end, file)
 
         table = output.OutputTable(4)
         table.appendRow("ASSET", "REVENUE", "EXPENDITURE", "TOTAL")
@@ -73,23 +92,29 @@ class IncomeCalculator():
             "TOTAL", self._total.revenue(), self._total.expenditure(), self._total.total()
         )
 
-        table.print()
+        table.print(file)
+
+    def printTxs(self, file=None):
 
-    def printTxs(self):
+        writer = output.csvWriter(file)
 
-        print("Date,Asset,Amount,Price,Revenue,Expense,Note")
+        writer.writerow((
+            "Date", "Asset", "Amount", "Price", "Revenue", "Expense", "Note"
+        ))
 
         def numFormat(n):
             return "{:.2f}".format(n) if n != 0 else ""
 
-        for tx in self._txs:
-            print("{},\"{}\",{},{},{},{},\"{}\"".format(
+        writer.writerows(
+            (
                 util.getPrettyDate(tx.date),
-                tx.asset.replace('"', '""'),
+                tx.asset,
                 numFormat(tx.amount),
                 numFormat(tx.price),
                 numFormat(tx.incomeValue.revenue()),
                 numFormat(tx.incomeValue.expenditure()),
-                tx.note.replace('"', '""')
-            ))
+                tx.note
+            )
+            for tx in self._txs
+        )
 
@@ -1,6 +1,24 @@
-import string, decimal
+import csv, decimal, gzip, string, sys
 from pycryptax import util
 
+# Buffer size of output files, so that rows are written in large blocks
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+def openOutput(path):
+
+    # Opens a file to write output to, compressed with gzip if the path ends in
+    # .gz
+
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", newline="")
+
+    return open(path, "w", newline="", buffering=OUTPUT_BUFFER_SIZE)
+
+def csvWriter(file=None):
+    return csv.writer(
+        sys.stdout if file is None else file, lineterminator="\n"
+    )
+
 class OutputTable():
 
     def __init__(self, cols):
@@ -36,19 +54,25 @@ class OutputTable():
     def appendGap(self):
         self._data.append(("",) * self._cols)
 
-    def print(self):
+    def render(self):
+
+        lines = []
 
         for row in self._data:
-            for cell, width in zip(row, self._colWidths):
-                padding = width-len(cell)
-                print(cell, end = " " * padding)
-            print()
+            lines.append("".join(
+                cell + " " * (width - len(cell))
+                for cell, width in zip(row, self._colWidths)
+            ))
+
+        return "\n".join(lines) + "\n\n"
 
-        print()
+    def print(self, file=None):
+        # The whole table is written at once
+        (sys.stdout if file is None else file).write(self.render())
 
 
-def printCalculationTitle(title, start, end):
+def printCalculationTitle(title, start, end, file=None):
     print("\n{} CALCULATION {} - {}:\n".format(
         title, util.getPrettyDate(start), util.getPrettyDate(end)
-    ))
+    ), file=file)
 
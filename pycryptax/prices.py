@@ -1,8 +1,13 @@
-import os, re
+import bisect, collections, copy, os, re, threading
+from array import array
 from decimal import Decimal
-from pycryptax import csvdata
+from pycryptax import csvdata, util, columnar, binprices
 
 FILENAME_PATTERN = r"^(.+)_(.+)\.csv$"
+BINARY_FILENAME_PATTERN = r"^(.+)_(.+)\.bin$"
+
+# Default number of (asset, date) lookups remembered by Prices.get
+DEFAULT_MEMO_SIZE = 1 << 16
 
 class AssetPricesNotFound(Exception):
     def __init__(self, asset):
@@ -13,38 +18,615 @@ class PriceNotFoundForDate(Exception):
         self.asset = asset
         self.date = date
 
+def timeKeysOf(assetPrices):
+    # The times of a price series as util.timeKey() keys
+    if isinstance(assetPrices, (
+        csvdata.CSVPrices, binprices.MappedPrices, columnar.ColumnarPrices
+    )):
+        return assetPrices.timeKeys()
+    return [util.timeKey(date) for date in assetPrices.dates()]
+
+class CompositePrices():
+
+    # The prices of an asset in the reporting asset, flattened from a chain of
+    # price files (eg. btc_usd and usd_gbp) so that a lookup needs a single
+    # bisect. There is an entry for every time at which any price in the chain
+    # changes, from the first time at which all prices in the chain exist.
+    #
+    # Times are held as an array of integer keys and prices as a
+    # util.DecimalArray, so that series of intraday prices stay compact.
+
+    def __init__(self, links, missingAsset=None, useColumnar=False):
+
+        self._columnar = None
+        self._bisects = 0
+        self._keys = array("q")
+        self._values = util.DecimalArray()
+
+        chain = [
+            (timeKeysOf(prices), prices.values()) for asset, prices in links
+        ]
+
+        # The asset and first date of each link, used to raise the same error
+        # as the chain would for dates before the composite series begins
+        self._firstDates = [
+            (asset, util.dateOfKey(linkKeys[0]) if len(linkKeys) else None)
+            for (asset, prices), (linkKeys, linkValues) in zip(links, chain)
+        ]
+
+        # The asset without prices that the chain ended at, if any
+        self._missingAsset = missingAsset
+
+        if missingAsset is not None \
+                or any(first is None for asset, first in self._firstDates):
+            return
+
+        start = util.timeKey(max(first for asset, first in self._firstDates))
+
+        keys = array("q", sorted(set(
+            key for linkKeys, linkValues in chain for key in linkKeys
+            if key >= start
+        )))
+
+        def walk():
+
+            # Walk every link forward once, yielding the latest price at or
+            # before each time
+
+            positions = [0] * len(chain)
+            current = [linkValues[0] for linkKeys, linkValues in chain]
+
+            for key in keys:
+
+                value = Decimal(1)
+
+                # Multiply from the end of the chain, as a recursive lookup
+                # would
+                for i in reversed(range(len(chain))):
+
+                    linkKeys, linkValues = chain[i]
+                    pos = positions[i]
+
+                    while pos + 1 < len(linkKeys) and linkKeys[pos + 1] <= key:
+                        pos += 1
+
+                    if pos != positions[i]:
+                        positions[i] = pos
+                        current[i] = linkValues[pos]
+
+                    value = current[i] * value
+
+                yield value
+
+        # Prices are stored as they are found rather than being gathered first
+        values = util.DecimalArray(walk())
+
+        if useColumnar:
+            self._columnar = columnar.ColumnarPrices(
+                None, list(values), keys=keys
+            )
+            return
+
+        self._keys = keys
+        self._values = values
+
+    def get(self, date):
+
+        if self._columnar is not None:
+            value = self._columnar.get(date)
+        else:
+            self._bisects += 1
+            i = bisect.bisect(self._keys, util.timeKey(date)) - 1
+            value = self._values[i] if i >= 0 else None
+
+        if value is None:
+            self.raiseMissing(date)
+
+        return value
+
+    def _indexAfter(self, pos, key):
+
+        # Finds the last index with a time no later than the key, searching
+        # forward from pos, which is known to be no later. Galloping keeps this
+        # cheap when the times are close together.
+
+        n = len(self._keys)
+        lo = pos
+        step = 1
+        hi = lo + 1
+
+        while hi < n and self._keys[hi] <= key:
+            lo = hi
+            step *= 2
+            hi = lo + step
+
+        self._bisects += 1
+        return bisect.bisect(self._keys, key, lo + 1, min(hi, n)) - 1
+
+    def pricesFor(self, dates):
+
+        # Returns the price for each date or None where there is none. Sorted
+        # dates are merged against the series with a single forward cursor.
+
+        if self._columnar is not None:
+            return self._columnar.getMany(dates)
+
+        values = []
+        pos = -1
+        last = None
+
+        for date in dates:
+
+            key = util.timeKey(date)
+
+            if last is not None and key < last:
+                # Not in order, so start again from the beginning
+                pos = -1
+
+            pos = self._indexAfter(pos, key)
+            last = key
+
+            values.append(self._values[pos] if pos >= 0 else None)
+
+        return values
+
+    def getMany(self, dates):
+
+        values = self.pricesFor(dates)
+
+        for date, value in zip(dates, values):
+            if value is None:
+                self.raiseMissing(date)
+
+        return values
+
+    def bisects(self):
+        return self._bisects
+
+    def usesAny(self, assets):
+        # True if the series depends on the prices of any of the assets
+        return self._missingAsset in assets \
+            or any(asset in assets for asset, first in self._firstDates)
+
+    def raiseMissing(self, date):
+
+        for asset, first in self._firstDates:
+            if first is None or date < first:
+                raise PriceNotFoundForDate(asset, date)
+
+        raise AssetPricesNotFound(self._missingAsset)
+
+def convertToBinary(dirpath):
+
+    # Writes a binary price file beside every price CSV file in the directory.
+    # Returns the number of files and prices converted.
+
+    files = 0
+    count = 0
+
+    for f in sorted(os.listdir(dirpath)):
+        if re.match(FILENAME_PATTERN, f):
+            filename = dirpath + "/" + f
+            count += binprices.convert(filename, filename[:-len(".csv")] + ".bin")
+            files += 1
+
+    return files, count
+
+class MappedChainPrices(CompositePrices):
+
+    # The prices of an asset in the reporting asset through a chain of binary
+    # price files. Rather than flattening the chain, which would read every
+    # price, each file is searched for a lookup. The result is the same as
+    # from a CompositePrices of the chain.
+
+    def __init__(self, links, missingAsset=None):
+
+        self._columnar = None
+        self._bisects = 0
+        self._links = [prices for asset, prices in links]
+        self._firstDates = [
+            (asset, prices.firstDate()) for asset, prices in links
+        ]
+        self._missingAsset = missingAsset
+
+    def get(self, date):
+
+        if self._missingAsset is None:
+
+            key = util.timeKey(date)
+            value = Decimal(1)
+
+            # Multiply from the end of the chain, as a CompositePrices does
+            for prices in reversed(self._links):
+
+                self._bisects += 1
+                price = prices.valueAt(key)
+
+                if price is None:
+                    break
+
+                value = price * value
+
+            else:
+                return value
+
+        self.raiseMissing(date)
+
+    def pricesFor(self, dates):
+
+        values = []
+
+        for date in dates:
+            try:
+                values.append(self.get(date))
+            except (AssetPricesNotFound, PriceNotFoundForDate):
+                values.append(None)
+
+        return values
+
 class Prices():
 
-    def __init__(self, reportAsset, dirpath):
+    def __init__(
+        self, reportAsset, dirpath, parseCache=None, executor=None,
+        memoSize=DEFAULT_MEMO_SIZE, useColumnar=False, timings=None
+    ):
+
+        if useColumnar and not columnar.available():
+            raise columnar.NumpyNotAvailable
 
         self._d = {}
+        self._composite = {}
         self._reportAsset = reportAsset
+        self._useColumnar = useColumnar
+
+        # Least recently used lookups and their results, which may be errors
+        self._memo = collections.OrderedDict()
+        # Lookups may be made by several threads at once, so the memo and the
+        # building of composite series are locked. reload() must not be called
+        # while lookups are made.
+        self._memoLock = threading.Lock()
+        self._compositeLock = threading.Lock()
+        self._memoSize = memoSize
+        self._memoHits = 0
+        self._memoMisses = 0
+        self._getCalls = 0
+        self._batchLookups = 0
+
+        self._dirpath = dirpath
+        self._parseCache = parseCache
+        self._executor = executor
+        # {asset: (filename, fileStat())} of the price files read
+        self._files = {}
+
+        self._d.update(self._load(self._scan(), timings))
+
+    def _scan(self):
+
+        # {asset: (filename, quoted asset)} of the price files in the directory.
+        # A binary price file is used in place of the CSV file it was
+        # converted from unless the CSV file has changed since.
+
+        files = {}
+        names = sorted(os.listdir(self._dirpath))
+        present = set(names)
+
+        for f in names:
+
+            match = re.match(FILENAME_PATTERN, f) \
+                or re.match(BINARY_FILENAME_PATTERN, f)
+
+            if not match:
+                continue
+
+            stem = f[:-len(".csv")]
+            isBinary = f.endswith(".bin")
+
+            if (stem + (".csv" if isBinary else ".bin")) in present:
+                current = binprices.isCurrent(
+                    self._dirpath + "/" + stem + ".bin",
+                    self._dirpath + "/" + stem + ".csv"
+                )
+                if current != isBinary:
+                    continue
+
+            base, quoted = match.groups()
+            files[base.lower()] = (self._dirpath + "/" + f, quoted.lower())
+
+        return files
 
-        for f in os.listdir(dirpath):
+    def _load(self, files, timings=None):
 
-            match = re.match(FILENAME_PATTERN, f)
+        # Reads the price files given as by _scan() and returns {asset: prices}.
+        # The files read are recorded once all have been read successfully.
 
-            if match:
-                base, quoted = match.groups()
-                self._d[base.lower()] = csvdata.CSVPrices(
-                    dirpath + "/" + f, quoted.lower()
+        loaded = {}
+        stats = {}
+
+        for asset, (filename, quoted) in files.items():
+
+            stats[asset] = (filename, csvdata.fileStat(filename))
+
+            if filename.endswith(".bin"):
+                # Mapped rather than read, so there is nothing to do in parallel
+                loaded[asset] = binprices.MappedPrices(filename, quoted)
+                continue
+
+            args = (filename, quoted, self._parseCache)
+            loaded[asset] = csvdata.CSVPrices(*args) \
+                if self._executor is None \
+                else self._executor.submit(csvdata.CSVPrices, *args)
+
+        if self._executor is not None:
+            # Wait for each file in turn so that the first failing file is
+            # reported as it would be when loading serially
+            for asset, assetPrices in loaded.items():
+                if not isinstance(assetPrices, binprices.MappedPrices):
+                    loaded[asset] = assetPrices.result()
+
+        if timings is not None:
+            for asset, assetPrices in loaded.items():
+                timings.fileRows(files[asset][0], len(assetPrices))
+
+        if self._useColumnar:
+            for asset, assetPrices in loaded.items():
+                if isinstance(assetPrices, binprices.MappedPrices):
+                    continue
+                loaded[asset] = columnar.ColumnarPrices(
+                    None, list(assetPrices.values()), assetPrices.quotedAsset(),
+                    keys=assetPrices.timeKeys()
                 )
 
+        self._files.update(stats)
+        return loaded
+
+    def reload(self, timings=None):
+
+        # Reads price files that were added or changed since they were last
+        # read and forgets removed ones. Composite series and remembered
+        # lookups are dropped only for assets whose chain of prices passes
+        # through a changed asset, or ended at one that had no prices. Nothing
+        # changes if a file cannot be read. Returns the assets affected.
+
+        files = self._scan()
+
+        changed = {
+            asset: (filename, quoted)
+            for asset, (filename, quoted) in files.items()
+            if self._files.get(asset) != (filename, csvdata.fileStat(filename))
+        }
+        removed = [asset for asset in self._files if asset not in files]
+
+        if not changed and not removed:
+            return set()
+
+        # Files that were already read are reloaded, so that rows appended to
+        # them are read alone. Copies are reloaded so that nothing changes if
+        # any file cannot be read.
+
+        reloaded = {}
+        stats = {}
+
+        for asset, (filename, quoted) in changed.items():
+
+            assetPrices = self._d.get(asset)
+
+            if isinstance(assetPrices, csvdata.CSVPrices) \
+                    and self._files[asset][0] == filename:
+                stats[asset] = (filename, csvdata.fileStat(filename))
+                reloaded[asset] = copy.copy(assetPrices)
+                reloaded[asset].reload(timings)
+
+        loaded = self._load(
+            {
+                asset: spec for asset, spec in changed.items()
+                if asset not in reloaded
+            },
+            timings
+        )
+
+        self._d.update(reloaded)
+        self._d.update(loaded)
+        self._files.update(stats)
+
+        for asset in removed:
+            del self._d[asset]
+            del self._files[asset]
+
+        affected = set(changed).union(removed)
+
+        affected.update(
+            asset for asset, composite in self._composite.items()
+            if composite.usesAny(affected)
+        )
+
+        for asset in affected:
+            self._composite.pop(asset, None)
+
+        for key in [key for key in self._memo if key[0] in affected]:
+            del self._memo[key]
+
+        return affected
+
+    def _materialise(self, asset):
+
+        # Follow the chain of quoted assets to the reporting asset
+
+        links = []
+        seen = set()
+
+        while asset != self._reportAsset:
+
+            if asset not in self._d or asset in seen:
+                return self._chainOf(links, asset)
+
+            seen.add(asset)
+            assetPrices = self._d[asset]
+            links.append((asset, assetPrices))
+            asset = assetPrices.quotedAsset()
+
+        return self._chainOf(links, None)
+
+    def _chainOf(self, links, missingAsset):
+
+        if links and all(
+            isinstance(prices, binprices.MappedPrices) for asset, prices in links
+        ):
+            return MappedChainPrices(links, missingAsset)
+
+        return CompositePrices(links, missingAsset, self._useColumnar)
+
+    def _getComposite(self, asset):
+
+        # Composite series are only built when an asset is first used
+
+        try:
+            return self._composite[asset]
+        except KeyError:
+            pass
+
+        with self._compositeLock:
+            # Another thread may have built it while waiting
+            composite = self._composite.get(asset)
+            if composite is None:
+                composite = self._composite[asset] = self._materialise(asset)
+            return composite
+
+    def _lookup(self, asset, date):
+        return self._getComposite(asset).get(date)
+
     def get(self, asset, date):
 
+        self._getCalls += 1
+
         if asset == self._reportAsset:
             return Decimal(1)
 
-        try:
+        if self._memoSize <= 0:
+            return self._lookup(asset, date)
+
+        key = (asset, date)
+
+        with self._memoLock:
+            result = self._memo.get(key)
+            if result is not None:
+                self._memoHits += 1
+                self._memo.move_to_end(key)
+
+        if result is None:
+
+            # Looked up without the lock so that other threads are not held up
+
+            try:
+                result = self._lookup(asset, date)
+            except (AssetPricesNotFound, PriceNotFoundForDate) as e:
+                result = e
+
+            with self._memoLock:
+
+                self._memoMisses += 1
+                self._memo[key] = result
+
+                if len(self._memo) > self._memoSize:
+                    self._memo.popitem(last=False)
+
+        if isinstance(result, Exception):
+            raise result.with_traceback(None)
+
+        return result
+
+    def getMany(self, asset, dates):
+
+        # Looks up the prices of an asset for a list of dates at once, without
+        # using the memo. Raises the error for the first date without a price.
+
+        if asset == self._reportAsset:
+            return [Decimal(1)] * len(dates)
+
+        return self._getComposite(asset).getMany(dates)
+
+    def priceMany(self, pairs):
+
+        # Looks up the price for each (asset, date) pair. The dates of each
+        # asset are looked up together, which is fastest when the pairs are in
+        # date order. Raises the error for the first pair without a price.
+
+        pairs = list(pairs)
+        byAsset = {}
+
+        self._batchLookups += len(pairs)
+
+        for i, (asset, date) in enumerate(pairs):
+            byAsset.setdefault(asset, []).append(i)
+
+        result = [None] * len(pairs)
+
+        for asset, indexes in byAsset.items():
+
+            dates = [pairs[i][1] for i in indexes]
+
+            if asset == self._reportAsset:
+                values = [Decimal(1)] * len(dates)
+            else:
+                values = self._getComposite(asset).pricesFor(dates)
+
+            for i, value in zip(indexes, values):
+                result[i] = value
+
+        for (asset, date), value in zip(pairs, result):
+            if value is None:
+                self._getComposite(asset).raiseMissing(date)
+
+        return result
+
+    def valueMany(self, records):
+
+        # Values each (asset, amount, date) record in the reporting asset
+
+        records = list(records)
+
+        prices = self.priceMany(
+            (asset, date) for asset, amount, date in records
+        )
+
+        return [
+            amount * price
+            for (asset, amount, date), price in zip(records, prices)
+        ]
+
+    def priceSeries(self):
+        # (asset, prices) for every asset with prices
+        return self._d.items()
+
+    def pricesUpTo(self, limit):
+
+        # Yields (asset, quoted asset, time keys, prices) for every asset in
+        # order, with the prices up to the limit
+
+        limitKey = util.timeKey(limit)
+
+        for asset in sorted(self._d):
             assetPrices = self._d[asset]
-        except KeyError:
-            raise AssetPricesNotFound(asset)
+            keys = timeKeysOf(assetPrices)
+            n = bisect.bisect_right(keys, limitKey)
+            yield (
+                asset, assetPrices.quotedAsset(), keys[:n],
+                assetPrices.values()[:n]
+            )
 
-        try:
-            return assetPrices[date] * self.get(assetPrices.quotedAsset(), date)
-        except KeyError:
-            raise PriceNotFoundForDate(asset, date)
+    def getCalls(self):
+        return self._getCalls
+
+    def batchLookups(self):
+        return self._batchLookups
+
+    def bisects(self):
+        return sum(c.bisects() for c in self._composite.values())
+
+    def memoHits(self):
+        return self._memoHits
+
+    def memoMisses(self):
+        return self._memoMisses
 
     def reportAsset(self):
         return self._reportAsset
-
@@ -0,0 +1,310 @@
+import contextlib, http.server, io, os, socketserver, stat, sys, threading, \
+    time, urllib.parse
+from pycryptax import csvdata, income, gains, prices, util, binprices
+
+DEFAULT_ADDRESS = "127.0.0.1:8000"
+
+ACTIONS = ("income", "txs", "gain", "disposals")
+
+class QueryError(Exception):
+    pass
+
+class ReloadLock():
+
+    # Held by any number of queries at once, or by a reload alone. A waiting
+    # reload keeps new queries from starting so that it is not put off for as
+    # long as queries keep arriving.
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queries = 0
+        self._reloading = False
+        self._waitingReloads = 0
+
+    @contextlib.contextmanager
+    def query(self):
+
+        with self._condition:
+            while self._reloading or self._waitingReloads:
+                self._condition.wait()
+            self._queries += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._queries -= 1
+                if not self._queries:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def reload(self):
+
+        with self._condition:
+            self._waitingReloads += 1
+            while self._reloading or self._queries:
+                self._condition.wait()
+            self._waitingReloads -= 1
+            self._reloading = True
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reloading = False
+                self._condition.notify_all()
+
+class Service():
+
+    # Data loaded once, and the calculations done on it for each query. gainData
+    # or incomeData may be None if it was not provided.
+    #
+    # Queries are calculated concurrently, as the data is only read by them and
+    # the prices lock what they remember between lookups. Reloading changes
+    # the data so it waits for running queries to finish.
+
+    def __init__(self, priceData, gainData, incomeData):
+        self._priceData = priceData
+        self._gainData = gainData
+        self._incomeData = incomeData
+        self._lock = ReloadLock()
+
+    def query(self, action, start, end, extraPeriods=()):
+
+        # Returns the content type and output of an action, as the command
+        # line would give it
+
+        with self._lock.query():
+            body = self._calculate(action, start, end, extraPeriods)
+
+        contentType = "text/csv" if action in ("txs", "disposals") \
+            else "text/plain"
+
+        return contentType, body
+
+    def reload(self):
+
+        # Reads data files that changed since they were last read. Returns
+        # {kind: [changed]} listing the price assets and the gains and income
+        # files that changed.
+
+        with self._lock.reload():
+
+            changed = {"prices": sorted(self._priceData.reload())}
+
+            for name, data in (
+                ("gains", self._gainData), ("income", self._incomeData)
+            ):
+                changed[name] = [] if data is None else data.reload()
+
+        return changed
+
+    def _calculate(self, action, start, end, extraPeriods):
+
+        out = io.StringIO()
+        periods = [(start, end)] + list(extraPeriods)
+
+        if action in ("income", "txs"):
+
+            if self._incomeData is None:
+                raise QueryError("No income information was provided")
+
+            for i, (periodStart, periodEnd) in enumerate(periods):
+
+                calc = income.IncomeCalculator(
+                    self._incomeData, self._priceData, periodStart, periodEnd
+                )
+
+                if action == "income":
+                    calc.printSummary(out)
+                else:
+                    if i > 0:
+                        print(file=out)
+                    calc.printTxs(out)
+
+        elif action in ("gain", "disposals"):
+
+            if self._gainData is None:
+                raise QueryError("No capital gains information was provided")
+
+            calc = gains.CapitalGainCalculator(
+                self._gainData, self._priceData, start, end,
+                summary=action == "gain", disposals=action == "disposals",
+                extraPeriods=extraPeriods
+            )
+
+            if action == "gain":
+                calc.printSummary(out)
+            else:
+                calc.printDisposals(out)
+
+        else:
+            raise QueryError("Unknown action {}".format(action))
+
+        return out.getvalue()
+
+def describeChanges(changed):
+    return "".join(
+        "{}: {}\n".format(name, ", ".join(items))
+        for name, items in changed.items()
+    )
+
+def describeReloadError(e):
+
+    if isinstance(e, FileNotFoundError):
+        # Missing data directories are raised without a filename
+        return "Cannot find {}".format(e.filename or "a data directory")
+    if isinstance(e, csvdata.CSVNotOpenable):
+        return "Cannot open CSV file {}".format(e)
+    if isinstance(e, csvdata.CSVKeyError):
+        return "Missing column(s) for {}".format(e.filename)
+    if isinstance(e, csvdata.CSVDateError):
+        return "Incorrect date \"{}\" in {} on line {}".format(
+            e.date, e.filename, e.line
+        )
+    if isinstance(e, binprices.BinaryPricesError):
+        return "Cannot use the binary price file {}".format(e)
+    if isinstance(e, csvdata.CSVNumberError):
+        return "A non numeric value found in {} on line {}".format(
+            e.filename, e.line
+        )
+
+    return str(e)
+
+RELOAD_ERRORS = (
+    OSError, csvdata.CSVNotOpenable, csvdata.CSVKeyError,
+    csvdata.CSVDateError, csvdata.CSVNumberError, binprices.BinaryPricesError
+)
+
+def pollReloads(service, interval):
+
+    # Reloads changed files every interval seconds in a background thread,
+    # reporting changes and errors on stderr. Errors leave the data that was
+    # last read successfully in use.
+
+    def poll():
+        while True:
+
+            time.sleep(interval)
+
+            try:
+                changed = service.reload()
+            except RELOAD_ERRORS as e:
+                print("Reload failed: " + describeReloadError(e), file=sys.stderr)
+                continue
+
+            if any(changed.values()):
+                print("Reloaded\n" + describeChanges(changed), file=sys.stderr)
+
+    thread = threading.Thread(target=poll, daemon=True)
+    thread.start()
+    return thread
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+    # Answers GET /ACTION?start=DATE&end=DATE with optional
+    # &period=START,END parameters for additional periods. POST /reload reads
+    # data files that changed since they were last read.
+
+    def do_POST(self):
+
+        if urllib.parse.urlsplit(self.path).path.strip("/") != "reload":
+            self._reply(404, "text/plain", "Unknown action\n")
+            return
+
+        try:
+            changed = self.server.service.reload()
+        except RELOAD_ERRORS as e:
+            self._reply(422, "text/plain", describeReloadError(e) + "\n")
+        else:
+            self._reply(200, "text/plain", describeChanges(changed))
+
+    def do_GET(self):
+
+        url = urllib.parse.urlsplit(self.path)
+        action = url.path.strip("/")
+
+        if action not in ACTIONS:
+            self._reply(404, "text/plain", "Unknown action\n")
+            return
+
+        params = urllib.parse.parse_qs(url.query)
+
+        try:
+            start = util.dateFromString(params["start"][0])
+            end = util.dateFromString(params["end"][0])
+            extraPeriods = [
+                tuple(util.dateFromString(d) for d in period.split(","))
+                for period in params.get("period", [])
+            ]
+            if any(len(period) != 2 for period in extraPeriods):
+                raise ValueError
+        except (KeyError, ValueError):
+            self._reply(
+                400, "text/plain",
+                "Give start and end dates, and any periods as START,END\n"
+            )
+            return
+
+        try:
+            contentType, body = self.server.service.query(
+                action, start, end, extraPeriods
+            )
+        except QueryError as e:
+            self._reply(404, "text/plain", str(e) + "\n")
+        except prices.AssetPricesNotFound as e:
+            self._reply(
+                422, "text/plain", "Cannot find a price for {}\n".format(e.asset)
+            )
+        except prices.PriceNotFoundForDate as e:
+            self._reply(422, "text/plain", "Cannot find a {} price for {}\n".format(
+                e.asset, util.getPrettyDate(e.date)
+            ))
+        except ValueError as e:
+            self._reply(422, "text/plain", str(e) + "\n")
+        else:
+            self._reply(200, contentType, body)
+
+    def _reply(self, status, contentType, body):
+
+        data = body.encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", contentType + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+class TCPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def makeServer(service, address):
+
+    # Addresses are HOST:PORT, PORT or unix:PATH for a Unix socket
+
+    if address.startswith("unix:"):
+
+        path = address[len("unix:"):]
+
+        # Remove a socket left behind by an earlier server
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+        server = UnixServer(path, RequestHandler)
+
+    else:
+        host, sep, port = address.rpartition(":")
+        server = TCPServer((host or "127.0.0.1", int(port)), RequestHandler)
+
+    server.service = service
+    return server
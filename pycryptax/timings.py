@@ -0,0 +1,88 @@
+import contextlib, json, sys, time
+
+# Records the wall and CPU time spent in each phase of a run, along with counts
+# of work done, for the --timings option. CPU time is only for this process, so
+# work done by worker processes shows as wall time. The time of a phase does not
+# include phases entered within it.
+
+class Timings():
+
+    def __init__(self):
+        # {name: [wall, cpu]} in the order phases were first entered
+        self._phases = {}
+        # {name: count}
+        self._counters = {}
+        # {filename: rows}
+        self._fileRows = {}
+        # [wall, cpu] of phases within each phase being timed
+        self._inner = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+
+        if name not in self._phases:
+            self._phases[name] = [0, 0]
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self._inner.append([0, 0])
+
+        try:
+            yield
+        finally:
+
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            innerWall, innerCpu = self._inner.pop()
+
+            self.add(name, wall - innerWall, cpu - innerCpu)
+
+            if self._inner:
+                self._inner[-1][0] += wall
+                self._inner[-1][1] += cpu
+
+    def add(self, name, wall, cpu):
+
+        if name not in self._phases:
+            self._phases[name] = [0, 0]
+
+        self._phases[name][0] += wall
+        self._phases[name][1] += cpu
+
+    def count(self, name, n=1):
+        self._counters[name] = self._counters.get(name, 0) + n
+
+    def fileRows(self, filename, rows):
+        self._fileRows[filename] = self._fileRows.get(filename, 0) + rows
+
+    def report(self, file=sys.stderr):
+
+        print("\nTIMINGS:\n", file=file)
+        print("{:<24} {:>12} {:>12}".format("PHASE", "WALL (s)", "CPU (s)"), file=file)
+
+        for name, (wall, cpu) in self._phases.items():
+            print("{:<24} {:>12.3f} {:>12.3f}".format(name, wall, cpu), file=file)
+
+        print("\n{:<40} {:>12}".format("COUNTER", "COUNT"), file=file)
+
+        for name, n in self._counters.items():
+            print("{:<40} {:>12}".format(name, n), file=file)
+
+        print("\n{:<60} {:>12}".format("FILE", "ROWS"), file=file)
+
+        for filename, rows in self._fileRows.items():
+            print("{:<60} {:>12}".format(filename, rows), file=file)
+
+        print(file=file)
+
+    def save(self, filename):
+
+        with open(filename, "w") as f:
+            json.dump({
+                "phases": {
+                    name: {"wall": wall, "cpu": cpu}
+                    for name, (wall, cpu) in self._phases.items()
+                },
+                "counters": self._counters,
+                "fileRows": self._fileRows
+            }, f, indent=1)
@@ -1,12 +1,102 @@
-import datetime, copy
+import contextlib, datetime, copy, functools, gc
+from array import array
+from decimal import Decimal
+
+ISO_FORMAT = "%Y-%m-%d"
+TEXT_FORMAT = "%d %b %Y"
+
+# Times that may follow a text date
+TEXT_TIME_FORMATS = (" %H:%M:%S", " %H:%M")
+
+# Maximum number of distinct dates remembered by the ISO parser and when
+# formatting dates for output
+DATE_CACHE_SIZE = 1 << 16
+
+EPOCH = datetime.datetime(1, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+DAY = datetime.timedelta(days=1)
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def isoDateFromString(s):
+
+    # Avoid strptime for the common zero padded YYYY-MM-DD form
+
+    if len(s) == 10 and s[4] == "-" and s[7] == "-" and s.isascii() \
+            and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit():
+        return datetime.datetime(int(s[:4]), int(s[5:7]), int(s[8:]))
+
+    if len(s) > 10 and s[10] in " T":
+        return isoTimeFromString(s)
+
+    return datetime.datetime.strptime(s, ISO_FORMAT)
+
+def isoTimeFromString(s):
+
+    # A date and time such as 2020-01-31 14:05 or 2020-01-31T14:05:30.5Z. Times
+    # with an offset are converted to UTC, so that all times compare.
+
+    if s.endswith(("Z", "z")):
+        s = s[:-1] + "+00:00"
+
+    d = datetime.datetime.fromisoformat(s)
+
+    if d.tzinfo is not None:
+        d = d.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return d
+
+def textDateFromString(s):
 
-def dateFromString(s):
     try:
-        return datetime.datetime.strptime(s, "%Y-%m-%d")
+        return datetime.datetime.strptime(s, TEXT_FORMAT)
     except ValueError:
-        return datetime.datetime.strptime(s, "%d %b %Y")
+        for timeFormat in TEXT_TIME_FORMATS:
+            try:
+                return datetime.datetime.strptime(s, TEXT_FORMAT + timeFormat)
+            except ValueError:
+                pass
+        raise
+
+def dateParserFor(s):
+
+    # Month names are the only letters allowed in either format, so they
+    # decide which format is used without needing to attempt a parse. Only
+    # the date is checked, as an ISO time may contain T or Z.
+
+    if any(c.isalpha() for c in s[:10]):
+        return textDateFromString
+
+    return isoDateFromString
+
+def dateFromString(s):
+    return dateParserFor(s)(s)
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def dayOf(d):
+    # The calendar day of a time, by which trades are matched
+    return datetime.datetime(d.year, d.month, d.day)
 
+def endOfDay(d):
+    # The last time of the calendar day of a time
+    return dayOf(d) + DAY - MICROSECOND
+
+# Lookups are often repeated for the same time, so keys are remembered
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def timeKey(d):
+    # A time as an integer number of microseconds, which is compact to store
+    # and orders as the times do
+    return (d - EPOCH) // MICROSECOND
+
+def dateOfKey(key):
+    return EPOCH + datetime.timedelta(microseconds=key)
+
+# Output rows often share a date, so formatted dates are remembered
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
 def getPrettyDate(d):
+
+    if d.hour or d.minute or d.second or d.microsecond:
+        return d.strftime("%d/%m/%Y %H:%M:%S")
+
     return d.strftime("%d/%m/%Y")
 
 def addToDictKey(d, k, v):
@@ -16,3 +106,111 @@ def addToDictKey(d, k, v):
     else:
         d[k] = copy.deepcopy(v)
 
+@contextlib.contextmanager
+def gcPaused():
+
+    # Pauses garbage collection while many objects without reference cycles
+    # are made, such as the rows of data files, which collection would
+    # otherwise scan again and again as they are made
+
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class DecimalArray():
+
+    # A list of Decimals held as int64 coefficients and int8 decimal exponents,
+    # about 9 bytes each against over 100 for a Decimal object. The few values
+    # that do not fit, such as those with more than 18 digits, negative zero or
+    # NaN, are kept as Decimal objects by index. Values are read back exactly.
+
+    __slots__ = ("_coefs", "_exps", "_wide")
+
+    def __init__(self, values=()):
+
+        self._coefs = array("q")
+        self._exps = array("b")
+        # {index: Decimal} of the values that do not fit
+        self._wide = {}
+
+        self.extend(values)
+
+    @staticmethod
+    def _encode(value):
+
+        # (coefficient, exponent) of the value, or None if it does not fit
+
+        sign, digits, exp = value.as_tuple()
+
+        if not isinstance(exp, int) or not -128 <= exp <= 127 \
+                or len(digits) > 18 or (sign and digits == (0,)):
+            return None
+
+        # Exact, as the coefficient is well within the context precision
+        return int(value.scaleb(-exp)), exp
+
+    def extend(self, values):
+
+        encode = self._encode
+
+        for value in values:
+
+            encoded = encode(value)
+
+            if encoded is None:
+                self._wide[len(self._coefs)] = value
+                encoded = (0, 0)
+
+            self._coefs.append(encoded[0])
+            self._exps.append(encoded[1])
+
+    def insert(self, i, value):
+
+        encoded = self._encode(value)
+
+        if self._wide:
+            self._wide = {
+                j + 1 if j >= i else j: wide for j, wide in self._wide.items()
+            }
+
+        if encoded is None:
+            self._wide[i] = value
+            encoded = (0, 0)
+
+        self._coefs.insert(i, encoded[0])
+        self._exps.insert(i, encoded[1])
+
+    def copy(self):
+        c = DecimalArray()
+        c._coefs = self._coefs[:]
+        c._exps = self._exps[:]
+        c._wide = dict(self._wide)
+        return c
+
+    def __len__(self):
+        return len(self._coefs)
+
+    def __getitem__(self, i):
+
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._coefs)))]
+
+        if self._wide:
+            if i < 0:
+                i += len(self._coefs)
+            if i in self._wide:
+                return self._wide[i]
+
+        return Decimal(self._coefs[i]).scaleb(self._exps[i])
+
+    def __iter__(self):
+
+        if self._wide:
+            return map(self.__getitem__, range(len(self._coefs)))
+
+        return map(Decimal.scaleb, map(Decimal, self._coefs), self._exps)
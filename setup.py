@@ -14,6 +14,9 @@ setup(
     author_email = "pycryptax@thelibertyportal.com",
     url = "https://github.com/MatthewLM/PyCryptax",
     packages = ["pycryptax"],
+    extras_require = {
+        "columnar" : ["numpy"]
+    },
     license = "MIT",
     classifiers = [
         "Programming Language :: Python :: 3",